@@ -40,11 +40,12 @@
 # - Personnel and equipment rental: Charge XXX daily for [list of 'Well-Phase'] for max XXX occurrences
 # - Some are specific to Well-Phase e.g. DD or TRS, some are continuous e.g. Mud logging or SCE rentals
 
-import openpyxl
-from settings import *
+import numpy as np
+import pandas as pd
+from schema import apply_schema
 
 # Proposed workflow:
-# - For each OCS file in the OCS folder, read each OCS file.
+# - For each OCS file in the OCS folder, read each OCS file (in parallel if settings.OCS_JOBS > 1).
 # TODO: - Use try-except to verify OCS validity and raise errors.
 # TODO: - Detect OCS revisions.
 # - Generate OCS rows for tariffs.
@@ -57,39 +58,25 @@ from settings import *
 # - All Item Number within the same OCS are unique.
 
 
-def read_OCS(excel_file_path):  # TODO: - Add 'Vendor' and 'Demand Category' to aid allocation.
-    try:
-        sheet_name = 'OCS Input'
-        table_name = 'OCSTable'
-        wb = openpyxl.load_workbook(filename=excel_file_path, data_only=True)
-        ws = wb[sheet_name]
-        lookup_table = ws.tables[table_name]
-        data = ws[lookup_table.ref]
-        rows_list = [[col.value for col in row] for row in data]
-        df = pd.DataFrame(data=rows_list[1:], index=None, columns=rows_list[0])
-        df['Well Name'] = ws['B5'].value
-        df['OCS Number'] = ws['B4'].value
-        df['WBS Number'] = ws['B6'].value
-        df['File Name'] = excel_file_path.name
-        wb.close()
-        return df
-    except Exception as e:
-        print(f"Error on {excel_file_path} :", e)
-
-
-# Load all OCS into a dataframe. Sorted by filename.
-df_OCS = pd.concat([read_OCS(f) for f in sorted(OCS_DIR.iterdir(), key=lambda x: x.name)], ignore_index=True)
-
 # Generate OCS rows per Event for each Tariff (i.e. no specified Event).
-for index, row in df_OCS[df_OCS['Event'].isna()].iterrows():
-    for well in df_AFE['Well Name'].unique() if pd.isna(row['Well Name']) else [row['Well Name']]:
-        for event in df_AFE[df_AFE['Well Name'] == well]['Event'].unique():
-            _row = row.copy()
-            _row['Event'] = event
-            _row['Well Name'] = well
-            _row['Description'] = _row['Description'] + " / " + well + " / " + event
-            df_OCS = pd.concat([df_OCS, _row.to_frame().T], ignore_index=True)
+# Tariffs without Well Name are generated for each well in the AFE.
+def expand_tariffs(df_OCS, df_AFE):
+    # Index Well Events once, ordered by first appearance of Well Name then Event.
+    well_events = df_AFE[['Well Name', 'Event']].drop_duplicates()
+    well_events = well_events.iloc[np.argsort(pd.factorize(well_events['Well Name'])[0], kind='stable')]
+    well_events['Well Event Order'] = range(len(well_events))
+    tariffs = df_OCS[df_OCS['Event'].isna()].drop(columns=['Event'])
+    tariffs['Tariff Order'] = range(len(tariffs))
+    all_wells = tariffs['Well Name'].isna()
+    df_tariffs = pd.concat([tariffs[all_wells].drop(columns=['Well Name']).merge(well_events, how='cross'),
+                            tariffs[~all_wells].merge(well_events, on='Well Name')], ignore_index=True)
+    df_tariffs = df_tariffs.sort_values(by=['Tariff Order', 'Well Event Order'], kind='stable')
+    df_tariffs['Description'] = df_tariffs['Description'] + " / " + df_tariffs['Well Name'] + " / " + df_tariffs['Event']
+    return pd.concat([df_OCS, df_tariffs[df_OCS.columns]], ignore_index=True)
+
 
-# Remove original Tariff and sort OCS.
-df_OCS.dropna(subset=['Event'], inplace=True)
-df_OCS.sort_values(by=['File Name', 'Item Number'], inplace=True, ignore_index=True)
+# Generate OCS rows per Event for each Tariff (i.e. no specified Event), remove original Tariff and sort OCS.
+def generate_OCS_rows(df_OCS, df_AFE):
+    df_OCS = expand_tariffs(df_OCS, df_AFE)
+    df_OCS = df_OCS.dropna(subset=['Event'])
+    return apply_schema(df_OCS.sort_values(by=['File Name', 'Item Number'], ignore_index=True))
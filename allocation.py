@@ -0,0 +1,33 @@
+# Methods to allocate DCCS charges to the well phases active on each date.
+
+# Proposed workflow:
+# - Index the non-zero day fraction of each phase by (Well Name, Event, Date), with day fraction by Event.
+# - Keep only the Phase Codes of each Well Event in the AFE.
+# - Join each non-zero charge cell to the phases of its Well Event active on its date.
+# - Only charged cells and active phases are ever joined, never DCCS rows x phases x dates.
+
+import numpy as np
+
+PHASE_KEYS = ['Well Name', 'Event', 'Date']
+
+
+# Index day fraction of the phases active on each (Well Name, Event, Date), with columns of grouped_df.
+# Day fraction by Event is the share of each phase in the day fraction of its Well Event on that date.
+# Rows are ordered by AFE Phase Code, then by date and grouped_df row.
+def build_phase_fraction_index(grouped_df, df_day_fraction, df_AFE, columns):
+    df_index = df_day_fraction[df_day_fraction['Day Fraction'] != 0].sort_values(by=['Date', 'Row'], kind='stable')
+    df_index = df_index.join(grouped_df[columns].reset_index(drop=True), on='Row')
+    df_index['Day Fraction by Event'] = (
+        df_index['Day Fraction'] / df_index.groupby(PHASE_KEYS, observed=True)['Day Fraction'].transform('sum'))
+    df_index['Fraction Order'] = np.arange(len(df_index))
+    afe_phases = df_AFE[['Well Name', 'Event', 'Phase Code']].reset_index(drop=True)
+    afe_phases['Phase Order'] = np.arange(len(afe_phases))
+    return afe_phases.merge(df_index.drop(columns=['Row']), on=['Well Name', 'Event', 'Phase Code'])
+
+
+# Join non-zero charge cells (Row, Date, Quantity and any line columns) to the phases active on their date.
+# Rows are ordered by charge Row, then as in the phase fraction index.
+def allocate_charges(df_lines, df_index):
+    df = df_lines.merge(df_index, on=PHASE_KEYS)
+    df = df.sort_values(by=['Row', 'Phase Order', 'Fraction Order'], kind='stable', ignore_index=True)
+    return df.drop(columns=['Phase Order', 'Fraction Order'])
@@ -0,0 +1,151 @@
+# Methods to archive daily DCCS snapshots as partitioned Parquet and query their history.
+
+# Proposed workflow:
+# - After export, write the run's charges (by line item, with cost in USD) and phase projection (grouped_df) to the
+#   archive, partitioned by run date and well (Hive layout, e.g. charges/run_date=2024-01-20/well=W1/).
+# - A run replaces all partitions of its run date, so that regenerating a day never duplicates it.
+# - Query cost trends, forecast drift and line item differences across snapshots. Run date and well filters prune
+#   partitions, other filters are pushed down to Parquet row groups, and only the columns asked for are read.
+
+# Archive tables:
+# - charges: line item (uid, OCS Number, Item Number, Well Name, Event, Cost Group, Description, Currency,
+#   SAP Unit Price), Date, Quantity and Cost (USD).
+# - phases: grouped_df, the performance tracker grouped by well phase.
+# Both have the partition columns run_date and well, read back as Run Date (datetime64[ns]) and dropped.
+
+# Settings (optional):
+# - ARCHIVE_DIR: directory of the archive, no archive is written if not set.
+
+import functools
+import operator
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from manual_inputs import row_uids, uid_part
+
+try:
+    import pyarrow
+    import pyarrow.dataset as ds
+except ImportError:  # Optional dependency, no archive is written.
+    pyarrow = None
+
+ARCHIVE_TABLES = ['charges', 'phases']
+LINE_COLUMNS = ['uid', 'OCS Number', 'Item Number', 'Well Name', 'Event', 'Cost Group', 'Description', 'Currency',
+                'SAP Unit Price']
+
+
+def partitioning():
+    return ds.partitioning(pyarrow.schema([('run_date', pyarrow.date32()), ('well', pyarrow.string())]),
+                           flavor='hive')
+
+
+# Directory of the partitions of run_date in an archive table.
+def run_date_dir(archive_dir, table_name, run_date):
+    return Path(archive_dir) / table_name / f'run_date={pd.Timestamp(run_date).date().isoformat()}'
+
+
+# Object columns as text (missing values kept), so that partitions written on different days share one schema.
+def with_text_columns(df):
+    df = df.copy()
+    for col in df.select_dtypes(include=['object', 'category']).columns:
+        df[col] = df[col].map(lambda x: None if pd.isna(x) else uid_part(x))
+    return df
+
+
+# Charges by line item (uid and descriptive columns of the DCCS row) with their cost in USD at today's FX table.
+def charge_lines(df_DCCS, df_charges, fx_table, today):
+    df_items = df_DCCS[LINE_COLUMNS[1:]].copy()
+    df_items.insert(0, 'uid', row_uids(df_DCCS))
+    df_items['SAP Unit Price'] = pd.to_numeric(df_items['SAP Unit Price'], errors='coerce')
+    df_lines = df_charges[['Row', 'Date', 'Quantity']].join(df_items, on='Row').drop(columns='Row')
+    amounts = df_lines['Quantity'] * df_lines['SAP Unit Price'].fillna(0)
+    df_lines['Cost (USD)'] = np.nan_to_num(fx_table.to_usd(amounts, df_lines['Currency'], df_lines['Date'],
+                                                           today=today))
+    return df_lines[LINE_COLUMNS + ['Date', 'Quantity', 'Cost (USD)']]
+
+
+# Write tables ({table name: dataframe with Well Name}) as the snapshot of run_date, replacing any previous one.
+def write_archive(archive_dir, run_date, tables):
+    if pyarrow is None:
+        print("[WARNING] pyarrow is not installed, no archive written.")
+        return
+    for table_name in ARCHIVE_TABLES:
+        df = with_text_columns(tables[table_name])
+        df['run_date'] = pd.Timestamp(run_date).date()
+        df['well'] = df['Well Name']
+        shutil.rmtree(run_date_dir(archive_dir, table_name, run_date), ignore_errors=True)
+        ds.write_dataset(pyarrow.Table.from_pandas(df, preserve_index=False), Path(archive_dir) / table_name,
+                         format='parquet', partitioning=partitioning(), basename_template='part-{i}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+
+
+def archive_dataset(archive_dir, table_name):
+    return ds.dataset(Path(archive_dir) / table_name, format='parquet', partitioning=partitioning())
+
+
+# Filter on wells and run dates from start to end (inclusive), and filter (a pyarrow.dataset expression) if given.
+def snapshot_filter(wells=None, start=None, end=None, filter=None):
+    conditions = [] if filter is None else [filter]
+    if wells is not None:
+        conditions.append(ds.field('well').isin(list(wells)))
+    if start is not None:
+        conditions.append(ds.field('run_date') >= pd.Timestamp(start).date())
+    if end is not None:
+        conditions.append(ds.field('run_date') <= pd.Timestamp(end).date())
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+
+# Convert an archive scan to a dataframe with Run Date first.
+def to_frame(table):
+    df = table.to_pandas()
+    df = df.drop(columns=[col for col in ['well'] if col in df.columns])
+    if 'run_date' in df.columns:
+        df.insert(0, 'Run Date', pd.to_datetime(df.pop('run_date')))
+    return df
+
+
+# Read columns (all by default) of an archive table for wells and run dates from start to end.
+def read_archive(archive_dir, table_name, columns=None, wells=None, start=None, end=None, filter=None):
+    if columns is not None:
+        columns = ['run_date'] + [col for col in columns if col not in ['run_date', 'Run Date']]
+    table = archive_dataset(archive_dir, table_name).to_table(columns=columns,
+                                                              filter=snapshot_filter(wells, start, end, filter))
+    return to_frame(table)
+
+
+# Projected cost of each well at each run date, and its change since the previous run date.
+def cost_trend(archive_dir, wells=None, start=None, end=None):
+    table = archive_dataset(archive_dir, 'charges').to_table(columns=['run_date', 'Well Name', 'Cost (USD)'],
+                                                             filter=snapshot_filter(wells, start, end))
+    table = table.group_by(['run_date', 'Well Name']).aggregate([('Cost (USD)', 'sum')])
+    df = to_frame(table).rename(columns={'Cost (USD)_sum': 'Cost (USD)'})
+    df = df[['Run Date', 'Well Name', 'Cost (USD)']].sort_values(by=['Well Name', 'Run Date'], ignore_index=True)
+    df['Change (USD)'] = df.groupby('Well Name')['Cost (USD)'].diff()
+    return df
+
+
+# Projected start and end of each well phase at each run date, and the drift of its end in days since the first
+# run date read.
+def forecast_drift(archive_dir, wells=None, start=None, end=None):
+    df = read_archive(archive_dir, 'phases', columns=['Well Name', 'Phase Code', 'Phase', 'Projection Start Time',
+                                                      'Projection End Time'], wells=wells, start=start, end=end)
+    df = df.sort_values(by=['Well Name', 'Phase Code', 'Run Date'], ignore_index=True)
+    first_end = df.groupby(['Well Name', 'Phase Code'])['Projection End Time'].transform('first')
+    df['Drift (days)'] = (df['Projection End Time'] - first_end).dt.total_seconds() / 86400
+    return df
+
+
+# Line items whose total Quantity or Cost (USD) differ between two run dates, with both totals and the change.
+def line_item_diff(archive_dir, run_date_a, run_date_b, wells=None):
+    run_dates = [pd.Timestamp(run_date_a), pd.Timestamp(run_date_b)]
+    df = read_archive(archive_dir, 'charges', columns=LINE_COLUMNS + ['Quantity', 'Cost (USD)'], wells=wells,
+                      filter=ds.field('run_date').isin([run_date.date() for run_date in run_dates]))
+    df_totals = df.groupby(['uid', 'Run Date'])[['Quantity', 'Cost (USD)']].sum()
+    df_diff = df.drop_duplicates('uid', keep='last').set_index('uid')[LINE_COLUMNS[1:]]
+    for value in ['Quantity', 'Cost (USD)']:
+        totals = df_totals[value].unstack('Run Date').reindex(index=df_diff.index, columns=run_dates).fillna(0)
+        df_diff[f'{value} A'], df_diff[f'{value} B'] = totals[run_dates[0]], totals[run_dates[1]]
+        df_diff[f'{value} Change'] = df_diff[f'{value} B'] - df_diff[f'{value} A']
+    changed = ~np.isclose(df_diff['Quantity Change'], 0) | ~np.isclose(df_diff['Cost (USD) Change'], 0)
+    return df_diff[changed].reset_index()
@@ -0,0 +1,108 @@
+# Methods to benchmark the pipeline on synthetic campaigns.
+
+# Proposed workflow:
+# - For each scale point, generate a synthetic campaign in a temporary folder.
+# - Run the pipeline stage by stage, recording time and peak traced memory of each stage.
+# - Print a table of results and optionally save them as CSV, to compare runs for regressions.
+# - Optionally report memory of the main frames as typed by the schema against inferred types (see schema.py).
+
+# Usage:
+# - python benchmark.py
+# - python benchmark.py --points small large --repeat 3 --output benchmark.csv
+# - python benchmark.py --points large --memory-report
+# - python benchmark.py --points small medium large --samples 10000 --no-memory
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from pipeline import Pipeline, STAGES
+from schema import memory_report
+from synthetic import CampaignSpec, generate_campaign
+
+SCALE_POINTS = {
+    'small': CampaignSpec(wells=3, phases=6, ocs_files=6, lines=12, days=60),
+    'medium': CampaignSpec(wells=8, phases=8, ocs_files=40, lines=40, days=180),
+    'large': CampaignSpec(wells=16, phases=8, ocs_files=120, lines=80, days=365),
+    'xlarge': CampaignSpec(wells=30, phases=8, ocs_files=300, lines=150, days=730),
+}
+
+
+# Run all stages of a pipeline in dependency order. Returns a row of (stage, seconds, peak MB) per stage.
+def profile_stages(settings, trace_memory=True):
+    pipeline = Pipeline(settings)
+    results = []
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        for name in STAGES:
+            if trace_memory:
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                getattr(pipeline, name)()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if trace_memory else None
+            results.append({'Stage': name, 'Seconds': seconds, 'Peak MB': peak})
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return results
+
+
+# Benchmark each scale point. Time is the best of repeat runs, peak memory is from the first run.
+# If samples, the monte_carlo stage forecasts that many samples (with a fixed seed).
+def run_benchmark(points, repeat=1, trace_memory=True, samples=None):
+    rows = []
+    for point in points:
+        spec = SCALE_POINTS[point]
+        with tempfile.TemporaryDirectory() as root:
+            settings = generate_campaign(root, spec)
+            settings.MONTE_CARLO_SAMPLES, settings.MONTE_CARLO_SEED = samples, 0
+            runs = [profile_stages(settings, trace_memory=trace_memory and i == 0) for i in range(repeat)]
+            for i, result in enumerate(runs[0]):
+                rows.append({'Point': point, 'Wells': spec.wells, 'OCS Lines': spec.ocs_files * spec.lines,
+                             'Days': spec.days, 'Samples': samples or 0, 'Stage': result['Stage'],
+                             'Seconds': min(run[i]['Seconds'] for run in runs), 'Peak MB': result['Peak MB']})
+    return pd.DataFrame(rows)
+
+
+# Memory of the main frames of each scale point, typed and with inferred types.
+def run_memory_report(points):
+    reports = []
+    for point in points:
+        with tempfile.TemporaryDirectory() as root:
+            pipeline = Pipeline(generate_campaign(root, SCALE_POINTS[point]))
+            with contextlib.redirect_stdout(io.StringIO()):
+                frames = {'OCS': pipeline.ingest_OCS()[0], 'lookahead': pipeline.project(),
+                          'phases': pipeline.grouped_df(), 'OCS rows': pipeline.expand_tariffs(),
+                          'DCCS rows': pipeline.DCCS_rows(), 'charges': pipeline.merge_manual_inputs()}
+            reports.append(memory_report(frames).assign(Point=point))
+    return pd.concat(reports, ignore_index=True)[['Point', 'Frame', 'Rows', 'Inferred MB', 'Typed MB', 'Reduction %']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DCCS pipeline on synthetic campaigns.")
+    parser.add_argument('--points', nargs='+', default=['small'], choices=list(SCALE_POINTS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="Skip memory tracing (faster, timing only).")
+    parser.add_argument('--output', help="Save results to this CSV file.")
+    parser.add_argument('--samples', type=int, help="Monte Carlo samples to forecast (no forecast if not set).")
+    parser.add_argument('--memory-report', action='store_true', help="Report memory of the main frames instead.")
+    args = parser.parse_args()
+    if args.memory_report:
+        print(run_memory_report(args.points).to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+        return
+    df = run_benchmark(args.points, repeat=args.repeat, trace_memory=not args.no_memory, samples=args.samples)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(df.to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+        print(df.groupby('Point', sort=False)[['Seconds']].sum().to_string(float_format=lambda x: f'{x:.3f}'))
+    if args.output:
+        df.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Methods to cache parsed workbooks on disk.
+
+# Proposed workflow:
+# - Key each parsed workbook by reader, file name and file content hash.
+# - Skip hashing when path, modification time and size are unchanged since the last run.
+# - Store dataframes as Feather, or pickle if Feather cannot round-trip them exactly.
+# - Evict least recently used entries above the size limit.
+# - Print a hit/miss summary at the end of the run.
+# - Optionally keep parsed dataframes in memory too, for long-running processes (see watch.py).
+
+# Settings (optional):
+# - CACHE_DIR: cache directory, None to disable caching.
+# - CACHE_SIZE_LIMIT: maximum cache size in bytes.
+
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather as feather
+except ImportError:  # Optional dependency, entries are pickled instead.
+    pyarrow = None
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'dccs_generator'
+DEFAULT_CACHE_SIZE_LIMIT = 1024 ** 3
+
+
+# Encode a column label to JSON, keeping dates and datetimes distinguishable from strings.
+def encode_label(label):
+    if isinstance(label, datetime.datetime):
+        return ['datetime', label.isoformat()]
+    if isinstance(label, datetime.date):
+        return ['date', label.isoformat()]
+    if label is None or isinstance(label, (str, int, float)):
+        return ['value', label]
+    return ['str', str(label)]
+
+
+def decode_label(encoded):
+    kind, value = encoded
+    if kind == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'date':
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+# Convert a dataframe read back from Arrow to the dtypes recorded when it was written.
+def restore_dtypes(df, dtypes):
+    for col, dtype in zip(df.columns, dtypes):
+        if dtype == 'object':
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+        elif str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+class ParseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+        self.enabled = cache_dir is not None
+        self.size_limit = size_limit
+        self.hits = 0
+        self.misses = 0
+        self.index = {'version': CACHE_VERSION, 'files': {}, 'entries': {}}
+        self.memory = None
+        if not self.enabled:
+            return
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / 'index.json'
+        try:
+            index = json.loads(self.index_path.read_text())
+            if index.get('version') == CACHE_VERSION:
+                self.index = index
+        except (OSError, ValueError):
+            pass
+
+    # Content hash of a file, reusing the previous hash if path, modification time and size are unchanged.
+    def file_hash(self, excel_file_path):
+        path = Path(excel_file_path).resolve()
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        cached = self.index['files'].get(str(path))
+        if cached and cached[:2] == signature:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        self.index['files'][str(path)] = signature + [sha.hexdigest()]
+        return sha.hexdigest()
+
+    def key(self, reader, excel_file_path):
+        text = f"{reader.__module__}.{reader.__qualname__}:{Path(excel_file_path).name}:{self.file_hash(excel_file_path)}"
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    # Also keep entries in memory from now on, as long as they are in the cache.
+    def keep_in_memory(self):
+        if self.memory is None:
+            self.memory = {}
+
+    # Return the cached dataframe for key, or None on a miss.
+    def get(self, key):
+        entry = self.index['entries'].get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.memory is not None and key in self.memory:
+            df = self.memory[key]
+        else:
+            try:
+                df = self.load(entry)
+            except Exception as e:
+                print(f"[WARNING] Dropping unreadable cache entry {key}: {e}")
+                self.remove(key)
+                self.misses += 1
+                return None
+            if self.memory is not None:
+                self.memory[key] = df
+        entry['last_access'] = time.time()
+        self.hits += 1
+        return df
+
+    def load(self, entry):
+        path = self.cache_dir / entry['file']
+        if entry['format'] == 'pickle':
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        table = feather.read_table(path, memory_map=True)
+        df = table.to_pandas(integer_object_nulls=True, timestamp_as_object=True)
+        df = restore_dtypes(df, entry['dtypes'])
+        df.columns = [decode_label(label) for label in entry['columns']]
+        return df
+
+    def put(self, key, df):
+        entry = {'columns': [encode_label(col) for col in df.columns],
+                 'dtypes': [str(dtype) for dtype in df.dtypes], 'last_access': time.time()}
+        try:
+            if pyarrow is None:
+                raise TypeError("pyarrow is not installed")
+            entry.update(file=f'{key}.feather', format='feather')
+            positional = df.set_axis([f'c{i}' for i in range(df.shape[1])], axis=1).reset_index(drop=True)
+            feather.write_feather(pyarrow.Table.from_pandas(positional, preserve_index=False),
+                                  self.cache_dir / entry['file'])
+            # Keep Feather only if the dataframe reads back exactly.
+            if not self.load(entry).equals(df.reset_index(drop=True)):
+                raise TypeError("lossy Feather round trip")
+        except Exception:
+            (self.cache_dir / f'{key}.feather').unlink(missing_ok=True)
+            entry.update(file=f'{key}.pkl', format='pickle')
+            with open(self.cache_dir / entry['file'], 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        entry['size'] = (self.cache_dir / entry['file']).stat().st_size
+        self.index['entries'][key] = entry
+        if self.memory is not None:
+            self.memory[key] = df
+        self.evict()
+
+    def remove(self, key):
+        entry = self.index['entries'].pop(key)
+        (self.cache_dir / entry['file']).unlink(missing_ok=True)
+        if self.memory is not None:
+            self.memory.pop(key, None)
+
+    # Remove least recently used entries until the cache fits the size limit.
+    def evict(self):
+        entries = self.index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total <= self.size_limit:
+                break
+            total -= entries[key]['size']
+            self.remove(key)
+
+    def save(self):
+        if not self.enabled:
+            return
+        temp_path = self.index_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(self.index))
+        os.replace(temp_path, self.index_path)
+
+    # Read excel_file_path with reader, or return the cached result of a previous read.
+    def read(self, reader, excel_file_path):
+        if not self.enabled:
+            return reader(excel_file_path)
+        try:
+            key = self.key(reader, excel_file_path)
+        except OSError:
+            return reader(excel_file_path)
+        df = self.get(key)
+        if df is None:
+            df = reader(excel_file_path)
+            if isinstance(df, pd.DataFrame):
+                self.put(key, df)
+        self.save()
+        return df
+
+    def summary(self):
+        if not self.enabled:
+            return "Parse cache disabled."
+        size = sum(entry['size'] for entry in self.index['entries'].values())
+        return (f"Parse cache: {self.hits} hits, {self.misses} misses, "
+                f"{len(self.index['entries'])} entries ({size / 1024 ** 2:.1f} MB) in {self.cache_dir}.")
+
+
+_parse_caches = {}
+
+
+# Get the parse cache configured in settings, shared by all modules of a run.
+def get_parse_cache(settings):
+    cache_dir = getattr(settings, 'CACHE_DIR', DEFAULT_CACHE_DIR)
+    size_limit = getattr(settings, 'CACHE_SIZE_LIMIT', DEFAULT_CACHE_SIZE_LIMIT)
+    if cache_dir not in _parse_caches:
+        _parse_caches[cache_dir] = ParseCache(cache_dir, size_limit)
+    return _parse_caches[cache_dir]
@@ -0,0 +1,291 @@
+# Methods to auto charge DCCS rows in batch.
+
+# Proposed workflow:
+# - Compile the charging mechanism of each DCCS row (cached by text and well).
+# - Group rows by mechanism kind ('from', 'for', 'on').
+# - Join each group to the non-zero day fractions it reads, giving a long table of non-zero charges.
+# - Clip charges to the maximum occurrences with a cumulative sum.
+# - Optionally reuse charges of rows whose inputs did not change since the previous run.
+
+# Charges are a long table of (Row, Date, Quantity), where Row is the position of the DCCS row.
+# Rows that cannot be charged are reported as (Row, Error) and kept out of the charge state, so they are retried.
+# Rows without a Charging Mechanism are manual input rows: they get no charges and are not errors.
+# The charge state is saved as plain arrays (np.savez, no pickled objects), keyed by a digest of each fingerprint.
+
+import hashlib
+import zipfile
+import numpy as np
+import pandas as pd
+from mechanism_parser import MechanismError
+from long_table import empty_long
+
+CHARGE_STATE_VERSION = 1
+CHARGE_STATE_ARRAYS = ['version', 'charge_keys', 'charge_counts', 'charge_dates', 'charge_quantities', 'row_keys',
+                       'row_texts', 'phase_keys', 'phase_windows']
+
+
+# Clip charges so that the cumulative Quantity of each Row, by Date, never exceeds its Cap (inf if uncapped).
+def clip_occurrences(df):
+    df = df.sort_values(by=['Row', 'Date'], kind='stable')
+    capped = np.isfinite(df['Cap'].to_numpy())
+    if capped.any():
+        cumulative = df['Quantity'].groupby(df['Row']).cumsum()
+        previous = cumulative.groupby(df['Row']).shift(fill_value=0).to_numpy()
+        quantity = df['Quantity'].to_numpy()
+        clipped = np.minimum(quantity, np.clip(df['Cap'].to_numpy() - previous, 0, None))
+        df['Quantity'] = np.where(capped, clipped, quantity)
+    return df
+
+
+# Join day fraction by phase to the Well Name, Event and Phase Code of each phase.
+def day_fraction_by_phase(grouped_df, df_day_fraction):
+    phases = grouped_df[['Well Name', 'Event', 'Phase Code']].reset_index(drop=True)
+    return df_day_fraction.join(phases, on='Row').rename(columns={'Row': 'Phase Row'})
+
+
+# Sum day fraction by Well Event and Date.
+def day_fraction_by_event(df_phase_fraction):
+    df_event_fraction = df_phase_fraction.groupby(['Well Name', 'Event', 'Date'], sort=False, observed=True)
+    return df_event_fraction['Day Fraction'].sum().reset_index()
+
+
+# Manual input rows have an empty or missing Charging Mechanism.
+def is_manual_row(text):
+    return not isinstance(text, str) or not text.strip()
+
+
+def charge_errors(errors):
+    return pd.DataFrame({'Row': np.array([row for row, _ in errors], dtype='int64'),
+                         'Error': [error for _, error in errors]})
+
+
+# Generate the long table of non-zero charges of DCCS rows from their charging mechanisms and the day fraction by
+# phase (long table where Row is the position in grouped_df).
+# Returns (charges, errors) where errors are the (Row, Error) of rows that cannot be charged.
+def build_charges(df_DCCS, grouped_df, df_day_fraction, dates, compiler):
+    dates = pd.DatetimeIndex(dates)
+    df_phase_fraction = day_fraction_by_phase(grouped_df, df_day_fraction)
+    df_event_fraction = day_fraction_by_event(df_phase_fraction)
+    well_events = set(zip(grouped_df['Well Name'], grouped_df['Event']))
+
+    # Compile mechanisms and group rows by mechanism kind.
+    groups = {'from': [], 'for': [], 'on': []}
+    errors = []
+    for i, (index, text, well, event) in enumerate(zip(df_DCCS.index, df_DCCS['Charging Mechanism'],
+                                                         df_DCCS['Well Name'], df_DCCS['Event'])):
+        if is_manual_row(text):
+            continue
+        try:
+            d = compiler.compile(text, well)
+            if d.recurrence != 'for' and (well, event) not in well_events:
+                raise MechanismError(f"Well Event {well}/{event} not in lookahead")
+            cap = np.inf if d.occurrence is None else d.occurrence
+            if d.recurrence == 'for':
+                for phase_code in sorted(set(dict(d.well_phases).get(well, ()))):
+                    groups['for'].append((i, well, event, phase_code, d.number, cap))
+            else:
+                groups[d.recurrence].append((i, well, event, pd.Timestamp(d.start), pd.Timestamp(d.end), d.number,
+                                             cap))
+        except MechanismError as e:
+            print(f"Charging error on row {index}: {text}! Error: {e}")
+            errors.append((i, str(e)))
+    charges = [empty_long('Quantity')]
+
+    # Date range: day fraction by Well Event between start and end dates, multiply Number.
+    if groups['from']:
+        df = pd.DataFrame(groups['from'], columns=['Row', 'Well Name', 'Event', 'Start', 'End', 'Number', 'Cap'])
+        df = df.merge(df_event_fraction, on=['Well Name', 'Event'])
+        df = df[(df['Date'] >= df['Start']) & (df['Date'] <= df['End'])].copy()
+        df['Quantity'] = df['Number'] * df['Day Fraction']
+        charges.append(clip_occurrences(df))
+
+    # Well phase: sum day fraction of listed Phase Codes of the Well Event, multiply Number.
+    if groups['for']:
+        df = pd.DataFrame(groups['for'], columns=['Row', 'Well Name', 'Event', 'Phase Code', 'Number', 'Cap'])
+        df = df.merge(df_phase_fraction, on=['Well Name', 'Event', 'Phase Code'])
+        df = df.sort_values(by=['Row', 'Phase Row', 'Date'], kind='stable')
+        df = df.groupby(['Row', 'Date']).agg(Fraction=('Day Fraction', 'sum'), Number=('Number', 'first'),
+                                             Cap=('Cap', 'first')).reset_index()
+        df['Quantity'] = df['Number'] * df['Fraction']
+        charges.append(clip_occurrences(df))
+
+    # Lump sum: if Well Event exists on the Start date, charge Number.
+    if groups['on']:
+        df = pd.DataFrame(groups['on'], columns=['Row', 'Well Name', 'Event', 'Date', 'End', 'Number', 'Cap'])
+        missing = df[~df['Date'].isin(dates)]
+        for row, date in zip(missing['Row'], missing['Date']):
+            print(f"Charging error on row {df_DCCS.index[row]}: {date.date()} not in lookahead date range")
+            errors.append((row, f"{date.date()} not in lookahead date range"))
+        df = df[df['Date'].isin(dates) & compiler.phase_index.events_active(df['Well Name'], df['Event'], df['Date'])]
+        df = df.assign(Quantity=df['Number'])
+        charges.append(df)
+
+    df_charges = pd.concat([df[['Row', 'Date', 'Quantity']] for df in charges], ignore_index=True)
+    df_charges = df_charges[df_charges['Quantity'] != 0]
+    return df_charges.sort_values(by=['Row', 'Date'], ignore_index=True), charge_errors(errors)
+
+
+# Projection windows of each Well Event, clipped to the date range. Returns {(Well Name, Event): windows}.
+def clipped_event_windows(grouped_df, dates):
+    lower, upper = dates[0], dates[-1] + pd.Timedelta(days=1)
+    starts = grouped_df['Projection Start Time'].clip(lower=lower, upper=upper)
+    ends = grouped_df['Projection End Time'].clip(lower=lower, upper=upper)
+    event_windows = {}
+    for well, event, code, start, end in zip(grouped_df['Well Name'], grouped_df['Event'], grouped_df['Phase Code'],
+                                             starts, ends):
+        event_windows.setdefault((well, event), []).append((code, start, end))
+    return {key: tuple(sorted(windows)) for key, windows in event_windows.items()}
+
+
+# Fingerprint everything the charges of each DCCS row are computed from: mechanism, Well Event, resolved dates and
+# the projection windows of the phases it reads. Rows that cannot be charged get None and are always recharged.
+def charge_fingerprints(df_DCCS, grouped_df, dates, compiler):
+    dates = pd.DatetimeIndex(dates)
+    event_windows = clipped_event_windows(grouped_df, dates)
+    fingerprints = []
+    for text, well, event in zip(df_DCCS['Charging Mechanism'], df_DCCS['Well Name'], df_DCCS['Event']):
+        try:
+            d = compiler.compile(text, well)
+        except MechanismError:
+            fingerprints.append(None)
+            continue
+        windows = event_windows.get((well, event))
+        if d.recurrence == 'for':
+            phase_list = dict(d.well_phases).get(well, ())
+            windows = tuple(window for window in windows or () if window[0] in phase_list)
+        elif windows is None:
+            fingerprints.append(None)
+            continue
+        fingerprints.append((text, well, event, d, windows))
+    return fingerprints
+
+
+# Key of a fingerprint in the charge state, stable across runs.
+def fingerprint_key(fingerprint):
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+
+
+# Keep the charges of each fingerprint as (dates, quantities) for the next run, except of rows in df_errors.
+# Rows and phase windows are kept as text, so that they compare equal to a state read back from file.
+def build_charge_state(df_DCCS, grouped_df, fingerprints, df_charges, df_errors):
+    state = {'charges': {}, 'rows': {}, 'phase_windows': {}, 'errors': df_errors}
+    row_charges = {row: (df['Date'].to_numpy(), df['Quantity'].to_numpy()) for row, df in df_charges.groupby('Row')}
+    empty = (np.array([], dtype='datetime64[ns]'), np.array([], dtype='float64'))
+    failed = set(df_errors['Row'])
+    for row, fingerprint in enumerate(fingerprints):
+        if fingerprint is not None and row not in failed:
+            state['charges'][fingerprint_key(fingerprint)] = row_charges.get(row, empty)
+    for key in zip(df_DCCS['File Name'], df_DCCS['Item Number'], df_DCCS['Well Name'], df_DCCS['Event'],
+                   df_DCCS['Charging Mechanism']):
+        state['rows'][repr(key[:4])] = repr(key[4])
+    for key in zip(grouped_df['Well Name'], grouped_df['Phase Code'],
+                   grouped_df['Projection Start Time'], grouped_df['Projection End Time']):
+        state['phase_windows'][repr(key[:2])] = repr(key[2:])
+    return state
+
+
+# Report the differences between the inputs of the previous and current runs.
+def diff_charge_state(previous_state, state):
+    changed_phases = {key for key in state['phase_windows'].keys() | previous_state['phase_windows'].keys()
+                      if state['phase_windows'].get(key) != previous_state['phase_windows'].get(key)}
+    changed_rows = {key for key, text in state['rows'].items() if previous_state['rows'].get(key) != text}
+    removed_rows = previous_state['rows'].keys() - state['rows'].keys()
+    return changed_phases, changed_rows, removed_rows
+
+
+# Generate charges like build_charges, reusing the charges of rows whose fingerprint is unchanged since the
+# previous run. If verify, compare against a full rebuild and use the full rebuild on mismatch.
+# Returns (charges, state) where state is passed to the next run, with the errors of this run in state['errors'].
+def build_charges_incremental(df_DCCS, grouped_df, df_day_fraction, dates, compiler, previous_state=None,
+                              verify=False):
+    dates = pd.DatetimeIndex(dates)
+    fingerprints = charge_fingerprints(df_DCCS, grouped_df, dates, compiler)
+    previous_charges = previous_state['charges'] if previous_state else {}
+    reused = {'Row': [], 'Date': [], 'Quantity': []}
+    recharge = []
+    for row, fingerprint in enumerate(fingerprints):
+        key = fingerprint_key(fingerprint) if fingerprint is not None else None
+        if key in previous_charges:
+            charge_dates, quantities = previous_charges[key]
+            if dates.get_indexer(charge_dates).min(initial=0) >= 0:
+                reused['Row'].append(np.full(len(quantities), row, dtype='int64'))
+                reused['Date'].append(charge_dates)
+                reused['Quantity'].append(quantities)
+                continue
+        recharge.append(row)
+    charges = [empty_long('Quantity')]
+    df_errors = charge_errors([])
+    if reused['Row']:
+        charges.append(pd.DataFrame({key: np.concatenate(values) for key, values in reused.items()}))
+    if recharge:
+        df_recharged, df_errors = build_charges(df_DCCS.iloc[recharge], grouped_df, df_day_fraction, dates, compiler)
+        df_recharged['Row'] = np.asarray(recharge, dtype='int64')[df_recharged['Row'].to_numpy()]
+        df_errors['Row'] = np.asarray(recharge, dtype='int64')[df_errors['Row'].to_numpy()]
+        charges.append(df_recharged)
+    df_charges = pd.concat(charges, ignore_index=True).sort_values(by=['Row', 'Date'], ignore_index=True)
+    state = build_charge_state(df_DCCS, grouped_df, fingerprints, df_charges, df_errors)
+    if previous_state:
+        changed_phases, changed_rows, removed_rows = diff_charge_state(previous_state, state)
+        print(f"[INFO] Incremental charging: {len(changed_phases)} phase windows changed, "
+              f"{len(changed_rows)} OCS rows added or changed, {len(removed_rows)} removed; "
+              f"recharged {len(recharge)} of {len(df_DCCS)} rows.")
+    if verify:
+        df_full, df_full_errors = build_charges(df_DCCS, grouped_df, df_day_fraction, dates, compiler)
+        df_compare = df_charges.merge(df_full, on=['Row', 'Date'], how='outer', suffixes=('', ' Full')).fillna(0)
+        mismatch = ~np.isclose(df_compare['Quantity'], df_compare['Quantity Full'], rtol=1e-9, atol=1e-12)
+        if mismatch.any():
+            print(f"[WARNING] Incremental charges differ from full rebuild on "
+                  f"{df_compare.loc[mismatch, 'Row'].nunique()} rows, using full rebuild.")
+            df_charges, df_errors = df_full, df_full_errors
+            state = build_charge_state(df_DCCS, grouped_df, fingerprints, df_charges, df_errors)
+        else:
+            print("[INFO] Incremental charges match full rebuild.")
+    n_failed = df_errors['Row'].nunique()
+    n_manual = sum(is_manual_row(text) for text in df_DCCS['Charging Mechanism'])
+    print(f"[INFO] DCCS rows charged: {len(df_DCCS) - n_manual - n_failed}, manual: {n_manual}, failed: {n_failed}")
+    return df_charges, state
+
+
+# Path of the charge state saved next to a DCCS workbook.
+def charge_state_path(excel_file_path):
+    return excel_file_path.with_name(excel_file_path.stem + '.charges.npz')
+
+
+# Read the charge state saved by write_charge_state. Anything else (older pickled states included) is ignored.
+def read_charge_state(excel_file_path):
+    try:
+        data = np.load(charge_state_path(excel_file_path), allow_pickle=False)
+        if not isinstance(data, np.lib.npyio.NpzFile) or set(data.files) != set(CHARGE_STATE_ARRAYS):
+            raise ValueError("not a charge state file")
+        with data:
+            if data['version'].item() != CHARGE_STATE_VERSION:
+                raise ValueError(f"charge state version {data['version'].item()}, expected {CHARGE_STATE_VERSION}")
+            splits = np.cumsum(data['charge_counts'])[:-1]
+            charges = zip(np.split(data['charge_dates'], splits), np.split(data['charge_quantities'], splits))
+            return {'charges': dict(zip(data['charge_keys'].tolist(), charges)),
+                    'rows': dict(zip(data['row_keys'].tolist(), data['row_texts'].tolist())),
+                    'phase_windows': dict(zip(data['phase_keys'].tolist(), data['phase_windows'].tolist())),
+                    'errors': charge_errors([])}
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"[INFO] No previous charge state, charging all rows: {e}")
+        return None
+
+
+# Save the charge state as plain arrays. Errors are not saved: failed rows are retried on the next run.
+def write_charge_state(excel_file_path, state):
+    charges = list(state['charges'].values())
+    arrays = {
+        'version': np.array(CHARGE_STATE_VERSION),
+        'charge_keys': np.array(list(state['charges']), dtype=str),
+        'charge_counts': np.array([len(quantities) for _, quantities in charges], dtype='int64'),
+        'charge_dates': np.concatenate([np.array([], dtype='datetime64[ns]')]
+                                       + [dates.astype('datetime64[ns]') for dates, _ in charges]),
+        'charge_quantities': np.concatenate([np.array([], dtype='float64')]
+                                            + [quantities.astype('float64') for _, quantities in charges]),
+        'row_keys': np.array(list(state['rows']), dtype=str),
+        'row_texts': np.array(list(state['rows'].values()), dtype=str),
+        'phase_keys': np.array(list(state['phase_windows']), dtype=str),
+        'phase_windows': np.array(list(state['phase_windows'].values()), dtype=str),
+    }
+    with open(charge_state_path(excel_file_path), 'wb') as f:
+        np.savez_compressed(f, **arrays)
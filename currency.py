@@ -0,0 +1,78 @@
+# Methods to convert costs to USD with a dated FX table.
+
+# Proposed workflow:
+# - Hold FX rates as (Currency, Date, Rate), Rate being units of Currency per USD (e.g. USDMYR for MYR).
+# - Look up rates of whole arrays of (currency, date) at once with a sorted key search, no loop over cells.
+# - Actual days (before Today) use the latest rate on or before that day, projected days use Today's rate.
+# - Days before the first rate of a currency use its first rate.
+# - Currencies missing from the table use the default currency (MYR, as the DCCS formulas assume).
+
+# Settings (optional):
+# - FX_RATES: dataframe, CSV or Excel file of Currency, Date and Rate. USD/MYR at USDMYR if not set.
+# - FX_DEFAULT_CURRENCY: currency of rows with a missing or unknown Currency, None to leave them unconverted.
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+DAY_OFFSET = 1 << 31  # Keeps day numbers positive within each currency's key range.
+
+
+# Days since epoch of datetime-like values as int64.
+def to_days(dates):
+    return np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+
+
+class FXTable:
+    def __init__(self, df_rates, default_currency=None):
+        df = df_rates[['Currency', 'Date', 'Rate']].dropna(subset=['Currency', 'Rate'])
+        df = df.assign(Date=pd.to_datetime(df['Date']).dt.normalize(), Rate=df['Rate'].astype(float))
+        if 'USD' not in set(df['Currency']):
+            df = pd.concat([df, pd.DataFrame({'Currency': ['USD'], 'Date': [pd.Timestamp(0)], 'Rate': [1.0]})])
+        df = df.sort_values(by=['Currency', 'Date'], kind='stable').drop_duplicates(['Currency', 'Date'], keep='last')
+        self.df_rates = df.reset_index(drop=True)
+        self.currencies = pd.Index(self.df_rates['Currency'].unique())
+        codes = self.currencies.get_indexer(self.df_rates['Currency'])
+        self.keys = codes * (2 * DAY_OFFSET) + to_days(self.df_rates['Date']) + DAY_OFFSET
+        self.rates = self.df_rates['Rate'].to_numpy()
+        self.first = np.searchsorted(codes, np.arange(len(self.currencies)))
+        self.default_currency = default_currency if default_currency in self.currencies else None
+
+    # Rates (units of currency per USD) of each (currency, date). If today is given, dates after today use today's
+    # rate. Unknown currencies use the default currency, or NaN if there is none.
+    def rate(self, currencies, dates, today=None):
+        codes = self.currencies.get_indexer(pd.Index(currencies, dtype=object))
+        unknown = codes < 0
+        if unknown.any():
+            names = [name for name in pd.unique(np.asarray(currencies, dtype=object)[unknown]) if not pd.isna(name)]
+            if names:
+                print(f"[WARNING] No FX rate for currencies {names}, using {self.default_currency}.")
+            if self.default_currency is not None:
+                codes[unknown] = self.currencies.get_loc(self.default_currency)
+        days = to_days(dates)
+        if today is not None:
+            days = np.minimum(days, to_days([today])[0])
+        known = codes >= 0
+        safe_codes = np.where(known, codes, 0)
+        positions = np.searchsorted(self.keys, safe_codes * (2 * DAY_OFFSET) + days + DAY_OFFSET, side='right') - 1
+        positions = np.maximum(positions, self.first[safe_codes])
+        return np.where(known, self.rates[positions], np.nan)
+
+    # Convert amounts in currencies on dates to USD.
+    def to_usd(self, amounts, currencies, dates, today=None):
+        return np.asarray(amounts, dtype=float) / self.rate(currencies, dates, today=today)
+
+
+# Load the FX table configured in settings.
+def load_fx_table(settings):
+    fx_rates = getattr(settings, 'FX_RATES', None)
+    if fx_rates is None:
+        df_rates = pd.DataFrame({'Currency': ['USD', 'MYR'], 'Date': [settings.TODAY] * 2,
+                                 'Rate': [1.0, settings.USDMYR]})
+    elif isinstance(fx_rates, pd.DataFrame):
+        df_rates = fx_rates
+    elif Path(fx_rates).suffix.lower() == '.csv':
+        df_rates = pd.read_csv(fx_rates)
+    else:
+        df_rates = pd.read_excel(fx_rates)
+    return FXTable(df_rates, default_currency=getattr(settings, 'FX_DEFAULT_CURRENCY', 'MYR'))
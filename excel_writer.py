@@ -0,0 +1,125 @@
+# Methods to write Excel workbooks in a single streaming pass.
+
+# Proposed workflow:
+# - Describe each sheet as a SheetLayout: dataframe, cells above the header, styles, widths, groups and panes.
+# - Register named styles once per workbook instead of styling cell by cell.
+# - Stream all sheets through a write-only workbook and save it once.
+
+from dataclasses import dataclass, field
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils.cell import get_column_letter
+
+CHUNK_SIZE = 1000
+
+
+# Named styles shared by all sheets. Header styles match pandas' to_excel header.
+def create_named_styles():
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+    green_fill = PatternFill(start_color='00FF00', end_color='00FF00', fill_type='solid')
+    return [
+        NamedStyle('Header', font=Font(bold=True), border=border,
+                   alignment=Alignment(horizontal='center', vertical='top')),
+        NamedStyle('Date Header', font=Font(bold=True), border=border, alignment=Alignment(horizontal='left'),
+                   number_format='YYYY-MM-DD'),
+        NamedStyle('Date Header Past', font=Font(bold=True), border=border, alignment=Alignment(horizontal='left'),
+                   number_format='YYYY-MM-DD', fill=yellow_fill),
+        NamedStyle('Date Header Yesterday', font=Font(bold=True), border=border,
+                   alignment=Alignment(horizontal='left'), number_format='YYYY-MM-DD', fill=green_fill),
+        NamedStyle('Right', alignment=Alignment(horizontal='right')),
+        NamedStyle('Integer', number_format='#,##0'),
+        NamedStyle('Cost', number_format='#,##0.00'),
+        NamedStyle('Fraction', number_format='0.00'),
+    ]
+
+
+# Layout of a worksheet written from a dataframe. Rows and columns are 1-based.
+@dataclass
+class SheetLayout:
+    title: str
+    df: pd.DataFrame
+    start_row: int = 0  # Number of rows above the header, as to_excel's startrow.
+    top_cells: dict = field(default_factory=dict)  # {(row, column): (value, style or None)} above the header.
+    header_styles: dict = field(default_factory=dict)  # {column: style}, 'Header' otherwise.
+    column_styles: dict = field(default_factory=dict)  # {column: style} applied to data cells.
+    column_widths: dict = field(default_factory=dict)  # {column: width}
+    column_groups: list = field(default_factory=list)  # [(first column, last column, hidden)]
+    freeze_panes: str = None
+    auto_filter: str = None
+
+
+# Convert a chunk of a dataframe to rows of Excel-ready values (None for missing, Python scalars otherwise).
+def excel_rows(df):
+    columns = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            values = np.array(col.dt.to_pydatetime(), dtype=object)
+        else:
+            values = col.to_numpy(dtype=object)
+        values[pd.isna(values)] = None
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def styled_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+
+def write_sheet(wb, layout):
+    ws = wb.create_sheet(layout.title)
+    for column, width in layout.column_widths.items():
+        ws.column_dimensions[get_column_letter(column)].width = width
+    for first, last, hidden in layout.column_groups:
+        ws.column_dimensions.group(get_column_letter(first), get_column_letter(last), hidden=hidden)
+    if layout.freeze_panes:
+        ws.freeze_panes = layout.freeze_panes
+    if layout.auto_filter:
+        ws.auto_filter.ref = layout.auto_filter
+
+    # Rows above the header.
+    n_columns = max([layout.df.shape[1]] + [column for _, column in layout.top_cells])
+    for row in range(1, layout.start_row + 1):
+        values = [None] * n_columns
+        for (_row, column), (value, style) in layout.top_cells.items():
+            if _row == row:
+                values[column - 1] = value if style is None else styled_cell(ws, value, style)
+        ws.append(values)
+
+    # Header.
+    ws.append([styled_cell(ws, value, layout.header_styles.get(i + 1, 'Header'))
+               for i, value in enumerate(layout.df.columns)])
+
+    # Data rows, converted in chunks to keep memory flat.
+    styled_columns = [(column - 1, style) for column, style in layout.column_styles.items()]
+    for start in range(0, len(layout.df), CHUNK_SIZE):
+        for row in excel_rows(layout.df.iloc[start:start + CHUNK_SIZE]):
+            if styled_columns:
+                row = list(row)
+                for i, style in styled_columns:
+                    row[i] = styled_cell(ws, row[i], style)
+            ws.append(row)
+    return ws
+
+
+def add_named_styles(wb):
+    for style in create_named_styles():
+        if style.name not in wb.named_styles:
+            wb.add_named_style(style)
+
+
+# Write all sheets to excel_file_path in one streaming pass.
+def write_workbook(excel_file_path, layouts):
+    wb = openpyxl.Workbook(write_only=True)
+    add_named_styles(wb)
+    for layout in layouts:
+        write_sheet(wb, layout)
+    wb.save(excel_file_path)
+    wb.close()
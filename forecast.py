@@ -0,0 +1,330 @@
+# Methods to forecast well cost and finish dates by Monte Carlo sampling of remaining phase durations.
+
+# Proposed workflow:
+# - Sample the duration of each operation without Actual Time between its AFE Time and DSV Time, for all samples at
+#   once as a (samples x operations) array. Operations with Actual Time keep it.
+# - Recompute projection windows of each well phase from the cumulative durations, as arrays.
+# - Charge each distinct (Charging Mechanism, Well Name, Event) once per sample as ramps over the phase windows it
+#   reads: cumulative quantity grows by Number per day of overlap, clipped to the maximum occurrences.
+# - Sum ramps into cumulative cost per well and day from Today on, on top of the actual cost before Today.
+# - Report P10/P50/P90 of cumulative cost per well and day, and of total cost and finish date per well.
+
+# Charges from Today on are priced at Today's FX rate, as in DCCS Expanded. Cost before Today is the run's charges
+# (with manual inputs) at the FX rate of each date.
+
+# Time grows with samples x charge terms: with 10000 samples, about 0.3 s on the small, 5 s on the medium and 30 s
+# on the large scale point of benchmark.py (24k charge terms), most of it adding ramps to the histograms.
+
+# Settings (optional):
+# - MONTE_CARLO_SAMPLES: number of samples, no forecast if not set.
+# - MONTE_CARLO_DISTRIBUTION: 'triangular' (mode at AFE Time, default), 'pert' or 'uniform' between AFE and DSV Time.
+# - MONTE_CARLO_SEED: seed of the random generator, for reproducible forecasts.
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils.cell import get_column_letter
+from excel_writer import SheetLayout
+from mechanism_parser import MechanismError, parse_mechanism
+from scenarios import daily_well_costs
+
+DISTRIBUTIONS = ('triangular', 'pert', 'uniform')
+PERCENTILES = (10, 50, 90)
+CHUNK_SIZE = 4_000_000  # Maximum samples x charge terms evaluated at once.
+ONE_DAY = pd.Timedelta(days=1)
+
+
+# Sample positions in [0, 1] of shape (n_samples, len(modes)), modes being positions in [0, 1].
+def sample_positions(distribution, modes, n_samples, rng):
+    shape = (n_samples, len(modes))
+    if distribution == 'uniform':
+        return rng.random(shape)
+    if distribution == 'pert':
+        return rng.beta(1 + 4 * modes, 1 + 4 * (1 - modes), size=shape)
+    if distribution == 'triangular':
+        u = rng.random(shape)
+        return np.where(u < modes, np.sqrt(u * modes), 1 - np.sqrt((1 - u) * (1 - modes)))
+    raise ValueError(f"Unknown distribution {distribution!r}, expected one of {DISTRIBUTIONS}")
+
+
+# Sample operation durations in hours, of shape (n_samples, operations). Operations with Actual Time keep it, others
+# are sampled between AFE Time and DSV Time (or keep their projection time if they have neither).
+def sample_durations(df_projection, n_samples, distribution, rng):
+    afe = pd.to_numeric(df_projection['AFE Time']).to_numpy(dtype=float)
+    dsv = pd.to_numeric(df_projection['DSV Time']).to_numpy(dtype=float)
+    fixed = df_projection['Projection Time'].to_numpy(dtype=float)
+    sampled = pd.isna(df_projection['Actual Time']).to_numpy() & ~(np.isnan(afe) & np.isnan(dsv))
+    low = np.fmin(afe, dsv)[sampled]
+    high = np.fmax(afe, dsv)[sampled]
+    mode = np.where(np.isnan(afe[sampled]), low, afe[sampled])
+    modes = np.divide(mode - low, high - low, out=np.zeros_like(low), where=high > low)
+    durations = np.broadcast_to(fixed, (n_samples, len(fixed))).copy()
+    durations[:, sampled] = low + (high - low) * sample_positions(distribution, modes, n_samples, rng)
+    return durations
+
+
+# Projection windows of each grouped_df phase per sample, in days since origin. Returns (starts, ends) of shape
+# (n_samples, phases).
+def sample_phase_windows(df_projection, grouped_df, durations, origin):
+    start = (df_projection['Start Time'].iloc[0] - origin) / ONE_DAY
+    op_ends = start + np.cumsum(durations, axis=1) / 24
+    op_starts = op_ends - durations / 24
+    positions = df_projection.reset_index(drop=True).groupby(['Well Name', 'Phase Code', 'Phase'],
+                                                             observed=True).indices
+    keys = zip(grouped_df['Well Name'], grouped_df['Phase Code'], grouped_df['Phase'])
+    first, last = np.array([(positions[key][0], positions[key][-1]) for key in keys], dtype='int64').reshape(-1, 2).T
+    return op_starts[:, first], op_ends[:, last]
+
+
+# Charge terms of DCCS rows: one per (distinct Charging Mechanism, Well Name, Event, phase read). Rows sharing a
+# mechanism, well and event have the same quantities, their USD prices at Today's rate are summed into Weight.
+# Points (window start, window end or lump sum date) are a day number since origin or a phase start/end.
+# Rows that cannot be charged are skipped (their errors are reported by the charge stage).
+def build_charge_terms(df_DCCS, grouped_df, fx_table, today, origin):
+    phase_index, event_phases = {}, {}
+    phase_codes = grouped_df['Phase Code'].tolist()
+    for i, (well, code, event) in enumerate(zip(grouped_df['Well Name'], grouped_df['Phase Code'],
+                                                 grouped_df['Event'])):
+        phase_index.setdefault((well, code), i)
+        event_phases.setdefault((well, event), []).append(i)
+    usd = np.nan_to_num(pd.to_numeric(df_DCCS['SAP Unit Price']).fillna(0).to_numpy(dtype=float) / fx_table.rate(
+        df_DCCS['Currency'], [today] * len(df_DCCS)))
+    df_groups = pd.DataFrame({'Text': df_DCCS['Charging Mechanism'].to_numpy(), 'Well Name': df_DCCS['Well Name'],
+                              'Event': df_DCCS['Event'], 'USD': usd})
+    df_groups = df_groups.groupby(['Text', 'Well Name', 'Event'], dropna=False, sort=False, observed=True)['USD'].sum()
+
+    def point(ref, well):
+        if ref.date is not None:
+            return (pd.Timestamp(ref.date) - origin) / ONE_DAY, -1, 0
+        if (well, ref.phase_code) not in phase_index:
+            raise MechanismError(f"Phase Code {ref.phase_code} of well {well} not in lookahead")
+        return np.nan, phase_index[(well, ref.phase_code)], int(ref.boundary == 'end')
+
+    terms = []
+    for group, ((text, well, event), usd) in enumerate(df_groups.items()):
+        try:
+            mechanism = parse_mechanism(text)
+            if mechanism.recurrence == 'for':
+                codes = set(dict(mechanism.well_phases).get(well, ()))
+                phases = [i for i in event_phases.get((well, event), []) if phase_codes[i] in codes]
+                start, end = (-np.inf, -1, 0), (np.inf, -1, 0)
+            elif (well, event) not in event_phases:
+                continue
+            else:
+                phases = event_phases[(well, event)]
+                start = point(mechanism.start, well)
+                end = point(mechanism.end, well) if mechanism.recurrence == 'from' else start
+        except MechanismError:
+            continue
+        allowed = np.inf
+        if mechanism.occurrence is not None and mechanism.number:
+            allowed = mechanism.occurrence / mechanism.number
+        for phase in phases:
+            terms.append((group, well, mechanism.recurrence, phase, mechanism.number * usd, allowed, *start, *end))
+    return pd.DataFrame(terms, columns=['Group', 'Well Name', 'Kind', 'Phase', 'Weight', 'Allowed', 'Start Day',
+                                        'Start Phase', 'Start Boundary', 'End Day', 'End Phase', 'End Boundary'])
+
+
+# Lowest and highest day of points over samples, for each term.
+def point_bounds(days, phases, boundaries, starts, ends):
+    low, high = days.astype(float), days.astype(float)
+    ref = phases >= 0
+    if ref.any():
+        is_start = boundaries[ref] == 0
+        low[ref] = np.floor(np.where(is_start, starts.min(axis=0)[phases[ref]], ends.min(axis=0)[phases[ref]]))
+        high[ref] = np.floor(np.where(is_start, starts.max(axis=0)[phases[ref]], ends.max(axis=0)[phases[ref]]))
+    return low, high
+
+
+# Reduce charge terms without changing costs from Today on, given the sampled phase windows:
+# - Open windows that never clip their phase, and drop terms that never overlap their window or lump sum date.
+# - Drop uncapped ramps of phases ended before Today, and lump sums before Today (their cost is the same in all
+#   samples).
+# - Merge identical uncapped ramps, and groups of identical capped ramps or lump sums, summing their weights.
+def simplify_terms(df_terms, starts, ends):
+    terms = {col: df_terms[col].to_numpy() for col in df_terms.columns}
+    start_low = starts.min(axis=0)[terms['Phase']]
+    end_high = ends.max(axis=0)[terms['Phase']]
+    window_start_low, window_start_high = point_bounds(terms['Start Day'], terms['Start Phase'],
+                                                       terms['Start Boundary'], starts, ends)
+    window_end_low, window_end_high = point_bounds(terms['End Day'], terms['End Phase'], terms['End Boundary'],
+                                                   starts, ends)
+    window_end_low, window_end_high = window_end_low + 1, window_end_high + 1
+    ramp = terms['Kind'] != 'on'
+    capped = np.isfinite(terms['Allowed'])
+
+    df = df_terms.assign(Kind=np.where(ramp, 'ramp', 'on'))
+    df.loc[ramp & (window_start_high <= start_low), ['Start Day', 'Start Phase', 'Start Boundary']] = (-np.inf, -1, 0)
+    df.loc[ramp & (window_end_low >= end_high), ['End Day', 'End Phase', 'End Boundary']] = (np.inf, -1, 0)
+    never = np.where(ramp, (window_end_high <= start_low) | (window_start_low >= end_high) | (end_high <= start_low),
+                     (window_start_high + 1 <= start_low) | (window_start_low >= end_high))
+    past = np.where(ramp, ~capped & (end_high <= 0), window_start_high + 1 <= 0)
+    df = df[~never & ~past]
+
+    spec = ['Well Name', 'Kind', 'Phase', 'Allowed', 'Start Day', 'Start Phase', 'Start Boundary', 'End Day',
+            'End Phase', 'End Boundary']
+    uncapped = ((df['Kind'] == 'ramp') & ~np.isfinite(df['Allowed'])).to_numpy()
+    df_uncapped = df[uncapped].groupby(spec, dropna=False, sort=False, as_index=False, observed=True)['Weight'].sum()
+    df_uncapped['Group'] = np.arange(len(df_uncapped))
+    df_grouped = df[~uncapped]
+    hashes = pd.util.hash_pandas_object(df_grouped[spec], index=False)
+    signatures = pd.factorize(hashes.groupby(df_grouped['Group'].to_numpy(), sort=False).agg(tuple))[0]
+    weights = df_grouped.groupby('Group', sort=False)['Weight'].first().groupby(signatures).sum()
+    group_signatures = pd.Series(signatures, index=pd.unique(df_grouped['Group']))
+    first_groups = group_signatures.drop_duplicates().index
+    df_grouped = df_grouped[df_grouped['Group'].isin(first_groups)]
+    df_grouped = df_grouped.assign(Group=len(df_uncapped) + df_grouped['Group'].map(group_signatures))
+    df_grouped['Weight'] = weights.to_numpy()[df_grouped['Group'].to_numpy() - len(df_uncapped)]
+    return pd.concat([df_uncapped, df_grouped[df_uncapped.columns]], ignore_index=True)
+
+
+# Day of points per sample: phase starts, phase ends and fixed days as columns of one array, so that the points of
+# many terms are resolved with one gather.
+class PointTable:
+    def __init__(self, starts, ends, days):
+        self.n_phases = starts.shape[1]
+        self.days = np.unique(days[~np.isnan(days)])
+        self.values = np.concatenate([np.floor(starts), np.floor(ends),
+                                      np.broadcast_to(self.days, (starts.shape[0], len(self.days)))], axis=1)
+
+    # Days of points (fixed days, or Start/End Boundary of phases) per sample, of shape (n_samples, points).
+    def resolve(self, days, phases, boundaries):
+        fixed = 2 * self.n_phases + np.searchsorted(self.days, np.where(np.isnan(days), 0, days))
+        return self.values[:, np.where(phases >= 0, boundaries * self.n_phases + phases, fixed)]
+
+
+# Histogram of ramps per sample and day, as (weights, weighted starts) of ramps starting on each day.
+# Ramp sums weight * max(j - x, 0) at day j are read with ramp_values.
+class RampHistogram:
+    def __init__(self, n_samples, n):
+        self.n_samples = n_samples
+        self.n = n
+        self.weights = np.zeros(n_samples * (n + 1))
+        self.moments = np.zeros(n_samples * (n + 1))
+
+    # Add ramps starting at x (of shape (n_samples, ramps)) with weights (of shape (ramps,) or as x).
+    def add(self, x, weights):
+        bins = np.clip(np.ceil(x), 0, self.n).astype('int64')
+        bins += (self.n + 1) * np.arange(self.n_samples)[:, None]
+        weights = np.broadcast_to(weights, x.shape)
+        self.weights += np.bincount(bins.ravel(), weights=weights.ravel(), minlength=len(self.weights))
+        self.moments += np.bincount(bins.ravel(), weights=(weights * x).ravel(), minlength=len(self.moments))
+
+    # Sum of weight * max(j - x, 0) of all ramps for j = 0 .. n - 1, of shape (n_samples, n).
+    def values(self):
+        weights = self.weights.reshape(self.n_samples, self.n + 1)[:, :self.n].cumsum(axis=1)
+        moments = self.moments.reshape(self.n_samples, self.n + 1)[:, :self.n].cumsum(axis=1)
+        return np.arange(self.n) * weights - moments
+
+
+# Add the cumulative cost of charge terms to a RampHistogram. Terms are sorted by Group, then by phase.
+def add_cumulative_cost(histogram, df_terms, starts, ends, points):
+    terms = {col: df_terms[col].to_numpy() for col in df_terms.columns}
+    ramp = terms['Kind'] == 'ramp'
+
+    # Date ranges and well phases: Number per day of overlap of each phase with the window, until maximum occurrences.
+    if ramp.any():
+        phase = terms['Phase'][ramp]
+        a = np.maximum(starts[:, phase], points.resolve(terms['Start Day'][ramp], terms['Start Phase'][ramp],
+                                                        terms['Start Boundary'][ramp]))
+        b = np.minimum(ends[:, phase], points.resolve(terms['End Day'][ramp], terms['End Phase'][ramp],
+                                                      terms['End Boundary'][ramp]) + 1)
+        np.maximum(b, a, out=b)
+        allowed = terms['Allowed'][ramp]
+        if np.isfinite(allowed).any():
+            # Phases of a group are in lookahead order, so occurrences are used up phase after phase.
+            lengths = b - a
+            before = np.cumsum(lengths, axis=1) - lengths
+            groups, index = np.unique(terms['Group'][ramp], return_index=True)
+            before -= before[:, index[np.searchsorted(groups, terms['Group'][ramp])]]
+            b = a + np.clip(allowed - before, 0, lengths)
+        weights = terms['Weight'][ramp]
+        histogram.add(a, weights)
+        histogram.add(b, -weights)
+
+    # Lump sums: Number at the end of the date if any phase of the Well Event is active on the date.
+    on = ~ramp
+    if on.any():
+        phase = terms['Phase'][on]
+        date = points.resolve(terms['Start Day'][on], terms['Start Phase'][on], terms['Start Boundary'][on])
+        active = (np.minimum(ends[:, phase], date + 1) - np.maximum(starts[:, phase], date)) > 0
+        groups, index = np.unique(terms['Group'][on], return_index=True)
+        active = np.logical_or.reduceat(active, index, axis=1)
+        weights = np.where(active, terms['Weight'][on][index], 0)
+        histogram.add(date[:, index], weights)
+        histogram.add(date[:, index] + 1, -weights)
+
+
+# Split terms into chunks of whole groups, each with at most max_terms terms (unless a group is larger).
+def chunk_terms(df_terms, max_terms):
+    bounds = np.flatnonzero(np.diff(df_terms['Group'].to_numpy(), prepend=-1)).tolist() + [len(df_terms)]
+    start = 0
+    for i, bound in enumerate(bounds[1:], start=1):
+        if bound - start > max_terms and bounds[i - 1] > start:
+            yield df_terms.iloc[start:bounds[i - 1]]
+            start = bounds[i - 1]
+    if start < len(df_terms):
+        yield df_terms.iloc[start:]
+
+
+# Forecast cumulative cost per well and day from Today on, and total cost and finish date per well.
+# df_projection is the projected lookahead, df_DCCS the DCCS rows and df_charges their charges (with manual inputs).
+# Returns (summary by well, cumulative cost percentiles by well and date).
+def forecast_well_costs(df_projection, grouped_df, df_DCCS, df_charges, fx_table, today, n_samples,
+                        distribution='triangular', seed=None):
+    origin = today.normalize()
+    rng = np.random.default_rng(seed)
+    durations = sample_durations(df_projection, n_samples, distribution, rng)
+    starts, ends = sample_phase_windows(df_projection, grouped_df, durations, origin)
+    n_days = max(int(np.ceil(ends.max())) + 1, 2)
+    df_terms = simplify_terms(build_charge_terms(df_DCCS, grouped_df, fx_table, today, origin), starts, ends)
+    points = PointTable(starts, ends, np.concatenate([df_terms['Start Day'], df_terms['End Day']]))
+
+    # Cost before Today from the run's charges.
+    df_costs = daily_well_costs(df_DCCS, df_charges, fx_table, today)
+    actual = df_costs[df_costs['Date'] < origin].groupby('Well Name', observed=True)['Cost (USD)'].sum()
+    projected = df_costs[df_costs['Date'] >= origin].groupby('Well Name', observed=True)['Cost (USD)'].sum()
+
+    dates = pd.date_range(origin, periods=n_days - 1)
+    summary, curves = [], []
+    for well in pd.unique(grouped_df['Well Name']):
+        histogram = RampHistogram(n_samples, n_days)
+        df_well = df_terms[df_terms['Well Name'] == well]
+        for df_chunk in chunk_terms(df_well, max(1, CHUNK_SIZE // n_samples)):
+            add_cumulative_cost(histogram, df_chunk, starts, ends, points)
+        cost = histogram.values()
+        cost = actual.get(well, 0) + cost[:, 1:] - cost[:, :1]
+        finish = ends[:, (grouped_df['Well Name'] == well).to_numpy()].max(axis=1)
+        percentiles = np.percentile(cost, PERCENTILES, axis=0)
+        curves.append(pd.DataFrame({'Well Name': well, 'Date': dates.date,
+                                    **{f'P{p} (USD)': values for p, values in zip(PERCENTILES, percentiles)}}))
+        row = {'Well Name': well, 'Deterministic Cost (USD)': actual.get(well, 0) + projected.get(well, 0),
+               'Deterministic Finish': grouped_df.loc[grouped_df['Well Name'] == well, 'Projection End Time'].max()}
+        row.update({f'P{p} Cost (USD)': value
+                    for p, value in zip(PERCENTILES, np.percentile(cost[:, -1], PERCENTILES))})
+        row.update({f'P{p} Finish': (origin + value * ONE_DAY).round('1s')
+                    for p, value in zip(PERCENTILES, np.percentile(finish, PERCENTILES))})
+        summary.append(row)
+    return pd.DataFrame(summary), pd.concat(curves, ignore_index=True)
+
+
+def forecast_path(excel_file_path):
+    return excel_file_path.with_name(excel_file_path.stem + '.forecast.xlsx')
+
+
+# Configure Forecast and Cumulative Cost tabs formatting.
+def forecast_layouts(df_summary, df_curves):
+    summary = SheetLayout('Forecast', df_summary, freeze_panes='B2')
+    summary.column_widths[1] = 13
+    for i, header in enumerate(df_summary.columns, start=1):
+        if header.endswith('(USD)'):
+            summary.column_styles[i] = 'Cost'
+            summary.column_widths[i] = 22
+        elif header.endswith('Finish'):
+            summary.column_widths[i] = 20
+    curves = SheetLayout('Cumulative Cost', df_curves, freeze_panes='C2',
+                         auto_filter=f'A1:{get_column_letter(df_curves.shape[1])}1')
+    curves.column_widths[2] = 13
+    for i in range(3, df_curves.shape[1] + 1):
+        curves.column_styles[i] = 'Cost'
+        curves.column_widths[i] = 18
+    return [summary, curves]
@@ -0,0 +1,110 @@
+# Methods to ingest Excel workbooks in read-only mode, optionally in parallel.
+
+# Proposed workflow:
+# - Locate named tables from the workbook package without loading the workbook.
+# - Stream table rows and metadata cells with openpyxl's read-only mode.
+# - Spread file reads across worker processes, keep results in file name order.
+# - Collect per-file failures into a report instead of dropping them.
+# - Skip files found in the parse cache.
+
+# This module has no import-time side effects so that worker processes can import it.
+
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+import openpyxl
+import pandas as pd
+from openpyxl.utils.cell import range_boundaries
+from schema import apply_schema
+
+
+# Find the cell range of a named table in the workbook package.
+def find_table_ref(excel_file_path, table_name):
+    with zipfile.ZipFile(excel_file_path) as archive:
+        for name in archive.namelist():
+            if name.startswith('xl/tables/') and name.endswith('.xml'):
+                table = ElementTree.fromstring(archive.read(name))
+                if table_name in (table.get('displayName'), table.get('name')):
+                    return table.get('ref')
+    raise KeyError(f"Table '{table_name}' not found")
+
+
+# Read a cell range of a worksheet opened in read-only mode as a list of rows of values.
+def read_range(ws, ref):
+    min_col, min_row, max_col, max_row = range_boundaries(ref)
+    return [list(row) for row in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                              values_only=True)]
+
+
+def read_OCS(excel_file_path):  # TODO: - Add 'Vendor' and 'Demand Category' to aid allocation.
+    sheet_name = 'OCS Input'
+    table_name = 'OCSTable'
+    ref = find_table_ref(excel_file_path, table_name)
+    wb = openpyxl.load_workbook(filename=excel_file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        rows_list = read_range(ws, ref)
+        ocs_number, well_name, wbs_number = [row[0] for row in read_range(ws, 'B4:B6')]
+    finally:
+        wb.close()
+    df = pd.DataFrame(data=rows_list[1:], index=None, columns=rows_list[0])
+    df['Well Name'] = well_name
+    df['OCS Number'] = ocs_number
+    df['WBS Number'] = wbs_number
+    df['File Name'] = excel_file_path.name
+    return df
+
+
+# Read one file and return (dataframe, None) or (None, error message).
+def _read_safely(read_function, excel_file_path):
+    try:
+        return read_function(excel_file_path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+# Read files with read_function using up to jobs worker processes (in-process if jobs is 1).
+# Files found in the parse cache (if any) are not read again.
+# Returns the concatenated dataframe in file name order, and a report of failed files.
+def ingest_files(file_paths, read_function, jobs=1, cache=None):
+    file_paths = sorted(file_paths, key=lambda x: x.name)
+    results = {}
+    keys = {}
+    if cache is not None and cache.enabled:
+        for f in file_paths:
+            try:
+                keys[f] = cache.key(read_function, f)
+            except OSError:
+                continue
+            df = cache.get(keys[f])
+            if df is not None:
+                results[f] = (df, None)
+    misses = [f for f in file_paths if f not in results]
+    jobs = max(1, min(jobs or 1, len(misses)))
+    if jobs == 1:
+        results.update({f: _read_safely(read_function, f) for f in misses})
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results.update(zip(misses, executor.map(_read_safely, [read_function] * len(misses), misses)))
+    for f in misses:
+        if f in keys and results[f][1] is None:
+            cache.put(keys[f], results[f][0])
+    if cache is not None:
+        cache.save()
+    results = [results[f] for f in file_paths]
+    df_list = [df for df, error in results if error is None]
+    df_errors = pd.DataFrame([(f.name, error) for f, (df, error) in zip(file_paths, results) if error is not None],
+                             columns=['File Name', 'Error'])
+    df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+    return df, df_errors
+
+
+# Load all OCS into a dataframe. Sorted by filename.
+def ingest_OCS(file_paths, jobs=1, cache=None):
+    file_paths = list(file_paths)
+    df_OCS, df_errors = ingest_files(file_paths, read_OCS, jobs=jobs, cache=cache)
+    df_OCS = apply_schema(df_OCS)
+    for file_name, error in zip(df_errors['File Name'], df_errors['Error']):
+        print(f"[WARNING] Skipped OCS {file_name}: {error}")
+    print(f"[INFO] OCS files read: {len(file_paths) - len(df_errors)}, failed: {len(df_errors)}")
+    return df_OCS, df_errors
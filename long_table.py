@@ -0,0 +1,41 @@
+# Methods to convert between long and wide date tables.
+
+# Charges and day fractions are carried as long tables of non-zero cells:
+# - Row: position of the DCCS row or grouped_df phase (int64)
+# - Date: day (datetime64[ns])
+# - Value column, e.g. Quantity or Day Fraction (float64)
+# The wide layout with one column per date is only built for Excel export.
+
+import numpy as np
+import pandas as pd
+
+
+# Create an empty long table.
+def empty_long(value_name):
+    return pd.DataFrame({'Row': np.array([], dtype='int64'), 'Date': np.array([], dtype='datetime64[ns]'),
+                         value_name: np.array([], dtype='float64')})
+
+
+# Convert the date columns of a wide table to a long table of numeric cells (non-zero unless keep_zeros).
+def to_long(df, date_columns, value_name, keep_zeros=False):
+    if not len(date_columns):
+        return empty_long(value_name)
+    values = df[date_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    mask = ~np.isnan(values) if keep_zeros else ~np.isnan(values) & (values != 0)
+    rows, cols = np.nonzero(mask)
+    dates = pd.DatetimeIndex(pd.to_datetime(list(date_columns)))
+    return pd.DataFrame({'Row': rows.astype('int64'), 'Date': dates[cols], value_name: values[rows, cols]})
+
+
+# Convert a long table to n_rows wide rows with one column (datetime.date) per date.
+# Missing cells are None (object columns) or fill (float columns).
+def to_wide(df_long, value_name, n_rows, dates, fill=None):
+    dates = pd.DatetimeIndex(dates)
+    values = np.full((n_rows, len(dates)), np.nan)
+    positions = dates.get_indexer(df_long['Date'])
+    in_range = positions >= 0
+    values[df_long['Row'].to_numpy()[in_range], positions[in_range]] = df_long[value_name].to_numpy()[in_range]
+    df = pd.DataFrame(values, columns=[date.date() for date in dates])
+    if fill is not None:
+        return df.fillna(fill)
+    return df.astype(object).where(df.notna(), None)
@@ -15,16 +15,20 @@
 # - Start Time (the very first start time of the lookahead)
 
 import openpyxl
-from settings import *
+import numpy as np
+import pandas as pd
+from schema import apply_schema
+
+TIME_PRIORITY = ('Actual Time', 'AFE Time', 'DSV Time')
 
 # Proposed workflow:
 # - Identify latest lookahead. Ensure lookahead is a named table.
 # TODO: - Use try-except to verify lookahead validity and raise errors.
 # - Identify number of unique wells in the lookahead.
-# - Compute Projection Time based on Actual Time, then AFE Time, then DSV Time.
+# - Compute Projection Time based on Actual Time, then AFE Time, then DSV Time (or another time priority).
 # - Recalculate Projection Start Time based on Projection Time.
 # - Generate Performance Tracker by well.
-# - Generate well phase day fraction by date.
+# - Generate well phase day fraction by date (long table, pivoted to dates only for export).
 
 # Proposed verification:
 # - Lookahead name, sheet name, and table name are as expected.
@@ -32,7 +36,7 @@ from settings import *
 # - Raise warning if there are gaps in Actual Time.
 
 
-def read_lookahead(excel_file_path=LATEST_LOOKAHEAD_DIR):
+def read_lookahead(excel_file_path):
     sheet_name = 'Drilling Input'
     table_name = 'LookaheadTable'
     wb = openpyxl.load_workbook(filename=excel_file_path, data_only=True)
@@ -42,12 +46,20 @@ def read_lookahead(excel_file_path=LATEST_LOOKAHEAD_DIR):
     rows_list = [[col.value for col in row] for row in data]
     df = pd.DataFrame(data=rows_list[1:], index=None, columns=rows_list[0])
     wb.close()
-    return df
+    return apply_schema(df)
+
 
+# Calculate Projection Time from the first available time of time_priority, in hours.
+def calc_projection_time(df, time_priority=TIME_PRIORITY):
+    projection_time = df[time_priority[0]]
+    for col in time_priority[1:]:
+        projection_time = projection_time.fillna(df[col])
+    return projection_time.fillna(0)
 
-def generate_lookahead_projection(df):
+
+def generate_lookahead_projection(df, time_priority=TIME_PRIORITY):
     start_time = df['Start Time'].iloc[0]
-    df['Projection Time'] = df['Actual Time'].fillna(df['AFE Time']).fillna(df['DSV Time']).fillna(0)
+    df['Projection Time'] = calc_projection_time(df, time_priority)
     df['Cumulative Projection Time'] = df['Projection Time'].cumsum().shift(fill_value=0)
     df['Projection Start Time'] = df['Cumulative Projection Time'].apply(lambda x: start_time + pd.Timedelta(hours=x))
     df['Projection End Time'] = df['Projection Start Time'] + pd.to_timedelta(df['Projection Time'], unit='hours')
@@ -65,57 +77,85 @@ def calc_intersection(start1, end1, start2, end2):
     return (end - start).total_seconds() / (60 * 60 * 24) if start < end else 0
 
 
-# Load workbook into dataframe.
-df_lookahead = read_lookahead()
-
-# Remove unnecessary columns.
-df_lookahead = df_lookahead[['Start Time', 'Well Name', 'Phase Code', 'Phase', 'Description', 'AFE Time', 'DSV Time',
-                             'Actual Time']]
-
-# Identify number of unique wells in the lookahead.
-lookahead_wells = {well for well in df_lookahead['Well Name'].unique() if well is not None}
-print(f"[INFO] Unique wells found in the lookahead: {lookahead_wells}")
+# Convert datetime-like values to a datetime64[ns] array.
+def to_datetime_array(values):
+    return pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(dtype='datetime64[ns]')
+
+
+# Calculate non-zero intersections of each datetime range with the date grid in number of days.
+# Returns a long dataframe of (Row, Date, Day Fraction) where Row is the position of the range.
+def calc_day_fraction_sparse(start_times, end_times, dates):
+    starts = to_datetime_array(start_times)
+    ends = to_datetime_array(end_times)
+    day_starts = to_datetime_array(dates)
+    one_day = np.timedelta64(1, 'D')
+    valid = ~np.isnat(starts) & ~np.isnat(ends) & (starts < ends)
+    # First and last day touched by each range, located on the (sorted) date grid.
+    first = np.searchsorted(day_starts, np.where(valid, starts, day_starts[:1]), side='right') - 1
+    last = np.searchsorted(day_starts, np.where(valid, ends, day_starts[:1]), side='left') - 1
+    first = np.clip(first, 0, None)
+    counts = np.where(valid, np.clip(last - first + 1, 0, None), 0)
+    rows = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = np.repeat(first, counts) + offsets
+    overlap = np.minimum(ends[rows], day_starts[cols] + one_day) - np.maximum(starts[rows], day_starts[cols])
+    fraction = overlap.astype('int64') / 1e9 / (60 * 60 * 24)
+    keep = fraction > 0
+    return pd.DataFrame({'Row': rows[keep], 'Date': day_starts[cols[keep]], 'Day Fraction': fraction[keep]})
+
+
+# Select lookahead columns and recalculate projected start time.
+def project_lookahead(df_lookahead, time_priority=TIME_PRIORITY):
+    # Remove unnecessary columns (keeping any other time columns of time_priority).
+    columns = ['Start Time', 'Well Name', 'Phase Code', 'Phase', 'Description', 'AFE Time', 'DSV Time', 'Actual Time']
+    df_lookahead = df_lookahead[columns + [col for col in time_priority if col not in columns]].copy()
+    # Identify number of unique wells in the lookahead.
+    lookahead_wells = set(df_lookahead['Well Name'].dropna().unique())
+    print(f"[INFO] Unique wells found in the lookahead: {lookahead_wells}")
+    return apply_schema(generate_lookahead_projection(df_lookahead, time_priority))
 
-# Recalculate projected start time.
-df_lookahead = generate_lookahead_projection(df_lookahead)
 
 # Identify well date range.
-well_start_time = df_lookahead[df_lookahead['Phase Code'] > 0]['Projection Start Time'].iloc[0]
-well_end_time = df_lookahead[df_lookahead['Phase Code'] > 0]['Projection End Time'].iloc[-1]
-well_date_range = pd.date_range(start=well_start_time.date(), end=well_end_time.date())
-
-# Generate performance tracker grouped by well phase.
-grouped_df = df_lookahead.groupby(['Well Name', 'Phase Code', 'Phase']).agg(
-    Projection_Start_Time=('Projection Start Time', 'first'),
-    Projection_End_Time=('Projection End Time', 'last'),
-    AFE_Time=('AFE Time', 'sum'),
-    Actual_Time=('Actual Time', 'sum'))
-grouped_df = grouped_df.rename({'Projection_Start_Time': 'Projection Start Time',
-                                'Projection_End_Time': 'Projection End Time',
-                                'AFE_Time': 'AFE Time',
-                                'Actual_Time': 'Actual Time'}, axis='columns')
-grouped_df = grouped_df.sort_values(by=['Projection Start Time', 'Phase Code']).reset_index()
-
-# Convert AFE Time and Actual Time from hours to days.
-grouped_df['AFE Time'] = grouped_df['AFE Time']/24
-grouped_df['Actual Time'] = grouped_df['Actual Time']/24
-
-# Generate projected time.
-grouped_df['Projected Time'] = grouped_df.apply(
-    lambda row: (row['Projection End Time'] - row['Projection Start Time']).total_seconds() / 86400 - row[
-        'Actual Time'], axis=1)
-
-# Generate days ahead or behind.
-grouped_df['Days Ahead/Behind'] = grouped_df.apply(
-    lambda row: (row['Projection End Time'] - row['Projection Start Time']).total_seconds() / 86400 - row[
-        'AFE Time'], axis=1)
-
-# Merge AFE Cost and Event onto performance tracker.
-grouped_df = grouped_df.merge(df_AFE.drop(['AFE Time'], axis=1), how='left')
-grouped_df = grouped_df.sort_values(by=['Projection Start Time', 'Phase Code'])
-
-# Generate day fraction per well phase.
-for date in well_date_range:
-    grouped_df[date.date()] = grouped_df.apply(
-        lambda row: calc_intersection(row['Projection Start Time'], row['Projection End Time'], date,
-                                      date + pd.Timedelta(days=1)), axis=1)
+def calc_well_date_range(df_lookahead):
+    well_phases = df_lookahead['Phase Code'].fillna(0) > 0
+    well_start_time = df_lookahead[well_phases]['Projection Start Time'].iloc[0]
+    well_end_time = df_lookahead[well_phases]['Projection End Time'].iloc[-1]
+    return pd.date_range(start=well_start_time.date(), end=well_end_time.date())
+
+
+# Generate performance tracker grouped by well phase, with AFE Cost and Event.
+def group_by_phase(df_lookahead, df_AFE):
+    grouped_df = df_lookahead.groupby(['Well Name', 'Phase Code', 'Phase'], observed=True).agg(
+        Projection_Start_Time=('Projection Start Time', 'first'),
+        Projection_End_Time=('Projection End Time', 'last'),
+        AFE_Time=('AFE Time', 'sum'),
+        Actual_Time=('Actual Time', 'sum'))
+    grouped_df = grouped_df.rename({'Projection_Start_Time': 'Projection Start Time',
+                                    'Projection_End_Time': 'Projection End Time',
+                                    'AFE_Time': 'AFE Time',
+                                    'Actual_Time': 'Actual Time'}, axis='columns')
+    grouped_df = grouped_df.sort_values(by=['Projection Start Time', 'Phase Code']).reset_index()
+
+    # Convert AFE Time and Actual Time from hours to days.
+    grouped_df['AFE Time'] = grouped_df['AFE Time']/24
+    grouped_df['Actual Time'] = grouped_df['Actual Time']/24
+
+    # Generate projected time.
+    grouped_df['Projected Time'] = grouped_df.apply(
+        lambda row: (row['Projection End Time'] - row['Projection Start Time']).total_seconds() / 86400 - row[
+            'Actual Time'], axis=1)
+
+    # Generate days ahead or behind.
+    grouped_df['Days Ahead/Behind'] = grouped_df.apply(
+        lambda row: (row['Projection End Time'] - row['Projection Start Time']).total_seconds() / 86400 - row[
+            'AFE Time'], axis=1)
+
+    # Merge AFE Cost and Event onto performance tracker.
+    grouped_df = grouped_df.merge(df_AFE.drop(['AFE Time'], axis=1), how='left')
+    return apply_schema(grouped_df.sort_values(by=['Projection Start Time', 'Phase Code']).reset_index(drop=True))
+
+
+# Generate day fraction per well phase as a long table of (Row, Date, Day Fraction), Row being the grouped_df row.
+def build_day_fractions(grouped_df, well_date_range):
+    return calc_day_fraction_sparse(grouped_df['Projection Start Time'], grouped_df['Projection End Time'],
+                                    well_date_range)
@@ -1,8 +1,14 @@
-from DCCS import *
+import argparse
+import importlib
+import sys
+from pathlib import Path
+import pandas as pd
+from pipeline import Pipeline, STAGES
+from watch import watch
 
 # C:\Users\Joachim.Wan\Desktop\OpsProject\dccs_generator
 # Proposed workflow:
-# - Adjust settings.py file to select data sources.
+# - Adjust settings.py file to select data sources (or override them on the command line).
 # - Read the latest Excel Campaign Lookahead. Extract and verify information.
 # - Read all OCS and OCS revisions. Extract and verify information.
 # - Read all tariffs. Extract and verify information.
@@ -11,14 +17,151 @@ from DCCS import *
 # - Generate charging instructions based on charging mechanisms and Lookahead (projected days).
 # - Generate charges based on manual inputs.
 
+# Usage:
+# - python main.py
+# - python main.py --lookahead Lookahead.xlsx --ocs-dir OCS --output DCCS_today.xlsx --jobs 8
+# - python main.py --stages lookahead --dry-run
+# - python main.py --stages tracker (DCCS Expanded of Today's DCCS already exported, from its sidecar if written)
+# - python main.py --format values parquet --cache-dir .cache --profile
+# - python main.py --watch
+# Exit status is 0 on success, 1 if the run (or a dry-run check) failed or any OCS file, DCCS row or manual input
+# failed, 2 on invalid arguments.
+
 '''
 numpy==1.22.3
 openpyxl==3.0.9
 pandas==1.4.2
 '''
 
-if __name__ == '__main__':
+# Stages asked for by each selection, the stages they depend on are run too. Selecting tracker without the export
+# reads Today's DCCS already exported instead of generating it again (settings.TRACKER_FROM_EXPORT).
+STAGE_SELECTIONS = {
+    'lookahead': ['grouped_df', 'day_fractions'],
+    'dccs': ['export'],
+    'tracker': ['performance_tracker'],
+    'all': STAGES,
+}
+FORMATS = ['formulas', 'values', 'parquet', 'feather']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Today's DCCS from the lookahead and OCS.")
+    parser.add_argument('--settings', default='settings', help="Settings module (default: settings).")
+    parser.add_argument('--lookahead', type=Path, help="Latest lookahead workbook (LATEST_LOOKAHEAD_DIR).")
+    parser.add_argument('--ocs-dir', type=Path, help="Folder of OCS workbooks (OCS_DIR).")
+    parser.add_argument('--latest-dccs', type=Path, help="Latest DCCS workbook, for manual inputs (LATEST_DCCS_DIR).")
+    parser.add_argument('--output', type=Path, help="Today's DCCS workbook to write (TODAY_DCCS_DIR).")
+    parser.add_argument('--today', help="Date of Today, e.g. 2024-01-20 (TODAY).")
+    parser.add_argument('--stages', nargs='+', default=['all'], metavar='STAGE',
+                        choices=list(STAGE_SELECTIONS) + STAGES,
+                        help=f"Stages to run: {', '.join(STAGE_SELECTIONS)} or stage names (default: all).")
+    parser.add_argument('--jobs', type=int, help="Worker processes for OCS ingestion and scenarios.")
+    parser.add_argument('--cache-dir', type=Path, help="Parse cache directory (CACHE_DIR).")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the parse cache.")
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=[],
+                        help="formulas or values in the DCCS sheet (EXPORT_VALUES), parquet to also archive the run "
+                             "(ARCHIVE_DIR, archive next to the output by default), feather to write the sidecar "
+                             "(SIDECAR).")
+    parser.add_argument('--archive-dir', type=Path, help="Parquet archive directory (ARCHIVE_DIR).")
+    parser.add_argument('--profile', action='store_true', help="Record time and memory of each stage (PROFILE).")
+    parser.add_argument('--profile-stage', choices=STAGES, help="Also cProfile this stage (PROFILE_STAGE).")
+    parser.add_argument('--dry-run', action='store_true', help="Check inputs and print the plan without running.")
+    parser.add_argument('--watch', action='store_true', help="Regenerate whenever inputs change (see watch.py).")
+    args = parser.parse_args(argv)
+    if 'formulas' in args.format and 'values' in args.format:
+        parser.error("--format formulas and values are exclusive")
+    if args.cache_dir is not None and args.no_cache:
+        parser.error("--cache-dir and --no-cache are exclusive")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+# Override settings with the command line arguments given.
+def apply_args(settings, args):
+    overrides = {'LATEST_LOOKAHEAD_DIR': args.lookahead, 'OCS_DIR': args.ocs_dir,
+                 'LATEST_DCCS_DIR': args.latest_dccs, 'TODAY_DCCS_DIR': args.output,
+                 'TODAY': pd.Timestamp(args.today) if args.today else None,
+                 'OCS_JOBS': args.jobs, 'SCENARIO_JOBS': args.jobs,
+                 'CACHE_DIR': args.cache_dir, 'ARCHIVE_DIR': args.archive_dir,
+                 'PROFILE_STAGE': args.profile_stage}
+    if args.no_cache:
+        settings.CACHE_DIR = None
+    if args.profile:
+        overrides['PROFILE'] = True
+    if 'formulas' in args.format or 'values' in args.format:
+        overrides['EXPORT_VALUES'] = 'values' in args.format
+    if 'feather' in args.format:
+        overrides['SIDECAR'] = True
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(settings, name, value)
+    if 'parquet' in args.format and getattr(settings, 'ARCHIVE_DIR', None) is None:
+        settings.ARCHIVE_DIR = Path(settings.TODAY_DCCS_DIR).with_name('archive')
+    if 'tracker' in args.stages and 'export' not in selected_stages(args.stages):
+        settings.TRACKER_FROM_EXPORT = True
+    return settings
+
+
+# Stage names of the selections, in dependency order.
+def selected_stages(selections):
+    names = {name for selection in selections for name in STAGE_SELECTIONS.get(selection, [selection])}
+    return [name for name in STAGES if name in names]
+
+
+# Problems with the inputs and output of settings, as messages.
+def check_inputs(settings):
+    if getattr(settings, 'TRACKER_FROM_EXPORT', False):
+        if not Path(settings.TODAY_DCCS_DIR).exists():
+            return [f"TODAY_DCCS_DIR {settings.TODAY_DCCS_DIR} does not exist, export it before a tracker-only run"]
+        return []
+    problems = []
+    for name in ['LATEST_LOOKAHEAD_DIR', 'OCS_DIR']:
+        path = Path(getattr(settings, name))
+        if not path.exists():
+            problems.append(f"{name} {path} does not exist")
+    if Path(settings.OCS_DIR).is_dir() and not any(Path(settings.OCS_DIR).iterdir()):
+        problems.append(f"OCS_DIR {settings.OCS_DIR} is empty")
+    if not Path(settings.TODAY_DCCS_DIR).parent.is_dir():
+        problems.append(f"Folder of TODAY_DCCS_DIR {settings.TODAY_DCCS_DIR} does not exist")
+    return problems
+
+
+# Print the inputs, outputs and stages of a run.
+def print_plan(settings, stages):
+    print(f"[INFO] Today: {settings.TODAY.date()}")
+    for name in ['LATEST_LOOKAHEAD_DIR', 'OCS_DIR', 'LATEST_DCCS_DIR', 'TODAY_DCCS_DIR', 'CACHE_DIR', 'ARCHIVE_DIR']:
+        print(f"[INFO] {name}: {getattr(settings, name, None)}")
+    print(f"[INFO] Stages: {', '.join(stages)} (and the stages they depend on)")
+    if getattr(settings, 'TRACKER_FROM_EXPORT', False):
+        print(f"[INFO] Performance tracker from the exported {settings.TODAY_DCCS_DIR}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
-        pass
+        settings = apply_args(importlib.import_module(args.settings), args)
+        stages = selected_stages(args.stages)
+        problems = check_inputs(settings)
+        for problem in problems:
+            print(f"[WARNING] {problem}")
+        if args.dry_run:
+            print_plan(settings, stages)
+            return 1 if problems else 0
+        if args.watch:
+            watch(settings)
+            return 0
+        pipeline = Pipeline(settings)
+        pipeline.run(*stages)
     except Exception as e:
         print("Error:", e)
+        return 1
+    failures = {name: n for name, n in pipeline.failures.items() if n}
+    if failures:
+        print(f"[WARNING] Failed inputs: {', '.join(f'{name} {n}' for name, n in failures.items())}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# Methods to keep manual inputs in a persistent SQLite store.
+
+# Proposed workflow:
+# - Key DCCS rows by a stable UID: OCS Number, Item Number, Well Name and Event.
+# - Harvest the date cells of the latest DCCS into the store, once per workbook (newer workbooks win).
+# - Apply stored cells before the cut-off date as overrides of the charges, in one keyed join.
+# - History survives in the store, old workbooks are never read again.
+
+# Settings (optional):
+# - MANUAL_INPUT_STORE: path of the SQLite store, manual_inputs.sqlite next to the latest DCCS by default.
+
+import hashlib
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from long_table import to_long
+
+UID_COLUMNS = ['OCS Number', 'Item Number', 'Well Name', 'Event']
+
+
+# Define cut-off date for manual inputs: days before (not including) the cut-off date take stored values.
+def manual_input_cutoff(today):
+    return today.normalize() - pd.Timedelta(days=2)  # Or custom date e.g. pd.Timestamp(2024, 5, 1).
+
+
+# Text of a UID part, so that 7, 7.0 and '7' read from Excel or OCS give the same UID.
+def uid_part(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# UID of each DCCS row.
+def row_uids(df):
+    parts = [df[col].astype(object).map(uid_part) for col in UID_COLUMNS]
+    return parts[0].str.cat(parts[1:], sep='|').to_numpy()
+
+
+def file_hash(excel_file_path):
+    sha = hashlib.sha256()
+    with open(excel_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ManualInputStore:
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.connection = sqlite3.connect(store_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS manual_inputs (
+                uid TEXT NOT NULL, date TEXT NOT NULL, quantity REAL NOT NULL, source TEXT,
+                PRIMARY KEY (uid, date));
+            CREATE INDEX IF NOT EXISTS manual_inputs_date ON manual_inputs (date);
+            CREATE TABLE IF NOT EXISTS harvested (
+                hash TEXT PRIMARY KEY, file_name TEXT, harvested_at TEXT);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def is_harvested(self, excel_file_path):
+        return self.connection.execute("SELECT 1 FROM harvested WHERE hash = ?",
+                                       (file_hash(excel_file_path),)).fetchone() is not None
+
+    # Store the date cells of DCCS rows (wide, as read by read_DCCS), replacing stored cells of these rows within the
+    # dates of the workbook so that cleared cells are cleared in the store too.
+    def harvest(self, df_DCCS, source):
+        df_DCCS = df_DCCS.copy()
+        df_DCCS.columns = [col.date() if isinstance(col, (datetime, pd.Timestamp)) else col for col in df_DCCS.columns]
+        date_columns = [col for col in df_DCCS.columns if pd.to_datetime(col, errors='coerce') is not pd.NaT]
+        if not date_columns:
+            return 0
+        uids = row_uids(df_DCCS)
+        df_cells = to_long(df_DCCS, date_columns, 'Quantity', keep_zeros=True)
+        first_date, last_date = min(date_columns).isoformat(), max(date_columns).isoformat()
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS harvest_uids (uid TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM harvest_uids")
+            self.connection.executemany("INSERT OR IGNORE INTO harvest_uids VALUES (?)", ((uid,) for uid in uids))
+            self.connection.execute("DELETE FROM manual_inputs WHERE date >= ? AND date <= ? "
+                                    "AND uid IN (SELECT uid FROM harvest_uids)", (first_date, last_date))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO manual_inputs (uid, date, quantity, source) VALUES (?, ?, ?, ?)",
+                zip(uids[df_cells['Row'].to_numpy()], df_cells['Date'].dt.strftime('%Y-%m-%d'),
+                    df_cells['Quantity'].astype(float), [source] * len(df_cells)))
+        return len(df_cells)
+
+    def mark_harvested(self, excel_file_path):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO harvested VALUES (?, ?, ?)",
+                                    (file_hash(excel_file_path), excel_file_path.name, datetime.now().isoformat()))
+
+    # Stored cells on dates from first_date to before the cut-off date as a dataframe of (uid, Date, Quantity).
+    def read(self, first_date, cutoff_date):
+        df = pd.read_sql_query("SELECT uid, date, quantity FROM manual_inputs WHERE date >= ? AND date < ?",
+                               self.connection,
+                               params=(first_date.strftime('%Y-%m-%d'), cutoff_date.strftime('%Y-%m-%d')))
+        return pd.DataFrame({'uid': df['uid'], 'Date': pd.to_datetime(df['date']),
+                             'Quantity': df['quantity'].astype(float)})
+
+    # Override the charges (long, by DCCS row) with stored cells of the same UID before the cut-off date.
+    def apply(self, df_DCCS, df_charges, dates, cutoff_date):
+        return apply_manual_inputs(df_DCCS, df_charges, self.read(dates[0], cutoff_date), dates)
+
+
+# Override the charges (long, by DCCS row) with manual inputs of (uid, Date, Quantity) on dates, in one keyed join.
+# Returns the charges and the number of overrides.
+def apply_manual_inputs(df_DCCS, df_charges, df_manual, dates):
+    df_manual = df_manual[df_manual['Date'].isin(dates)]
+    df_rows = pd.DataFrame({'uid': row_uids(df_DCCS), 'Row': np.arange(len(df_DCCS), dtype='int64')})
+    df_manual = df_manual.merge(df_rows, on='uid')[['Row', 'Date', 'Quantity']]
+    df_charges = pd.concat([df_manual, df_charges], ignore_index=True)
+    df_charges = df_charges.drop_duplicates(subset=['Row', 'Date'], keep='first')
+    return df_charges.sort_values(by=['Row', 'Date'], ignore_index=True), len(df_manual)
+
+
+# Path of the manual input store configured in settings.
+def manual_input_store_path(settings):
+    return getattr(settings, 'MANUAL_INPUT_STORE', settings.LATEST_DCCS_DIR.parent / 'manual_inputs.sqlite')
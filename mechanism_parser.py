@@ -0,0 +1,206 @@
+# Methods to parse and compile charging mechanisms.
+
+# Charging mechanism grammar:
+# - mechanism := NUMBER UNIT recurrence [occurrences]
+# - recurrence := 'from' point 'to' point | 'for' DICT | 'on' point
+# - point := DATE | ('start' | 'end') 'phase' PHASE_CODE
+# - occurrences := ['for'] ('maximum' | 'max') NUMBER ('occurrences' | 'occurrence')
+# - DATE is YYYY/mm/dd, DICT is a literal {'Well Name': [Phase Code, ...]}.
+
+# Proposed workflow:
+# - Tokenize and parse each distinct mechanism text once (cached by text).
+# - Resolve phase references against projected phase windows of a PhaseIndex (cached by text and well).
+# - Report errors with the position of the offending token.
+
+import ast
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+TOKEN_PATTERN = re.compile(r'(?P<DICT>\{[^{}]*\})|(?P<DATE>\d{4}/\d{2}/\d{2})(?=\s|$)'
+                           r'|(?P<NUMBER>[-+]?(?:\d+\.?\d*|\.\d+))(?=\s|$)|(?P<WORD>\S+)')
+
+
+class MechanismError(ValueError):
+    def __init__(self, message, text='', position=None, length=1):
+        self.text = text
+        self.position = position
+        if position is not None:
+            message = f"{message} at position {position}:\n  {text}\n  {' ' * position}{'^' * max(length, 1)}"
+        super().__init__(message)
+
+
+# Reference to a date, or to the start or end of a Phase Code of the charged well.
+@dataclass(frozen=True)
+class PointRef:
+    date: object = None
+    boundary: str = None  # 'start' or 'end'.
+    phase_code: int = None
+    position: int = None
+
+
+# Parsed charging mechanism, independent of well and lookahead.
+@dataclass(frozen=True)
+class Mechanism:
+    text: str
+    number: float
+    recurrence: str  # 'from', 'for' or 'on'.
+    start: PointRef = None
+    end: PointRef = None
+    well_phases: tuple = None  # ((Well Name, (Phase Code, ...)), ...)
+    occurrence: float = None  # None if uncapped.
+
+
+# Charging instruction with phase references resolved to dates.
+@dataclass(frozen=True)
+class Instruction:
+    number: float
+    recurrence: str
+    start: object = None
+    end: object = None
+    well_phases: tuple = None
+    occurrence: float = None
+
+
+# Split mechanism text into (kind, value, position) tokens.
+def tokenize(text):
+    return [(m.lastgroup, m.group(), m.start()) for m in TOKEN_PATTERN.finditer(text)]
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    def error(self, message, token=None):
+        if token is None:
+            return MechanismError(f"{message} at end of text", self.text)
+        return MechanismError(message, self.text, token[2], len(token[1]))
+
+    def peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def next(self, expected):
+        token = self.peek()
+        if token is None:
+            raise self.error(f"Expected {expected}")
+        self.index += 1
+        return token
+
+    def expect_word(self, *words):
+        token = self.next(' or '.join(repr(w) for w in words))
+        if token[1].lower() not in words:
+            raise self.error(f"Expected {' or '.join(repr(w) for w in words)}, found {token[1]!r}", token)
+        return token[1].lower()
+
+    def number(self):
+        token = self.next('a number')
+        if token[0] != 'NUMBER':
+            raise self.error(f"Expected a number, found {token[1]!r}", token)
+        return float(token[1])
+
+    def point(self):
+        token = self.next("a date or 'start'/'end' phase")
+        if token[0] == 'DATE':
+            try:
+                return PointRef(date=datetime.strptime(token[1], '%Y/%m/%d').date(), position=token[2])
+            except ValueError:
+                raise self.error(f"Invalid date {token[1]!r}", token)
+        if token[1].lower() in ('start', 'end'):
+            self.expect_word('phase')
+            code = self.next('a Phase Code')
+            if code[0] != 'NUMBER' or not float(code[1]).is_integer():
+                raise self.error(f"Expected a Phase Code, found {code[1]!r}", code)
+            return PointRef(boundary=token[1].lower(), phase_code=int(float(code[1])), position=token[2])
+        raise self.error(f"Expected a date (YYYY/mm/dd) or 'start'/'end' phase, found {token[1]!r}", token)
+
+    def well_phases(self):
+        token = self.next('a well phase dict')
+        if token[0] != 'DICT':
+            raise self.error(f"Expected a well phase dict, found {token[1]!r}", token)
+        try:
+            value = ast.literal_eval(token[1])
+        except (ValueError, SyntaxError):
+            raise self.error("Invalid well phase dict", token)
+        if not isinstance(value, dict):
+            raise self.error("Invalid well phase dict", token)
+        well_phases = []
+        for well, phase_codes in value.items():
+            if not isinstance(phase_codes, (list, tuple, set)):
+                phase_codes = [phase_codes]
+            if not isinstance(well, str) or not all(isinstance(c, int) for c in phase_codes):
+                raise self.error(f"Expected 'Well Name': [Phase Code, ...], found {well!r}: {phase_codes!r}", token)
+            well_phases.append((well, tuple(phase_codes)))
+        return tuple(well_phases)
+
+    def occurrence(self):
+        token = self.peek()
+        if token is None:
+            return None
+        if token[1].lower() == 'for':
+            self.index += 1
+        self.expect_word('maximum', 'max')
+        occurrence = self.number()
+        self.expect_word('occurrences', 'occurrence')
+        return occurrence
+
+    def parse(self):
+        number = self.number()
+        self.next('a unit')
+        recurrence = self.expect_word('from', 'for', 'on')
+        start = end = well_phases = None
+        if recurrence == 'from':
+            start = self.point()
+            self.expect_word('to')
+            end = self.point()
+        elif recurrence == 'for':
+            well_phases = self.well_phases()
+        else:
+            start = self.point()
+        occurrence = self.occurrence()
+        token = self.peek()
+        if token is not None:
+            raise self.error(f"Unexpected {token[1]!r}", token)
+        return Mechanism(self.text, number, recurrence, start, end, well_phases, occurrence)
+
+
+# Parse a charging mechanism text. Cached by text.
+@lru_cache(maxsize=None)
+def parse_mechanism(text):
+    if not isinstance(text, str) or not text.strip():
+        raise MechanismError("Charging mechanism is empty")
+    return _Parser(text).parse()
+
+
+# Compile charging mechanisms into instructions for a well, resolving phases with a PhaseIndex. Cached by (text, well).
+class MechanismCompiler:
+    def __init__(self, phase_index):
+        self.phase_index = phase_index
+        self.cache = {}
+
+    def resolve(self, mechanism, point, well):
+        if point is None or point.date is not None:
+            return None if point is None else point.date
+        try:
+            window = self.phase_index.window(well, point.phase_code)
+        except KeyError:
+            raise MechanismError(f"Phase Code {point.phase_code} of well {well} not in lookahead",
+                                 mechanism.text, point.position)
+        return (window[0] if point.boundary == 'start' else window[1]).date()
+
+    def compile(self, text, well):
+        key = (text, well)
+        if key not in self.cache:
+            try:
+                mechanism = parse_mechanism(text)
+                self.cache[key] = Instruction(mechanism.number, mechanism.recurrence,
+                                              self.resolve(mechanism, mechanism.start, well),
+                                              self.resolve(mechanism, mechanism.end, well),
+                                              mechanism.well_phases, mechanism.occurrence)
+            except MechanismError as e:
+                self.cache[key] = e
+        if isinstance(self.cache[key], MechanismError):
+            raise self.cache[key]
+        return self.cache[key]
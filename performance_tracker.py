@@ -3,11 +3,23 @@
 # Proposed workflow:
 # - Bridge lookahead's day fraction by phase to DCCS via Event.
 # - Create adjusted day fraction by phase by Event.
-
+# - Run as a stage of pipeline.Pipeline, nothing is done at import. DCCS Expanded is written with the export.
+# - Take DCCS rows, charges, phases and day fraction from the generation step as long tables.
+# - Or, for a tracker-only run, from Today's DCCS already exported: its sidecar (memory-mapped) if written, the
+#   workbook otherwise.
+# - Join row metadata to non-zero (Row, Date, value) cells by Row.
+# - Allocate non-zero charges to the phases active on their date (see allocation.py).
+
+import numpy as np
 import openpyxl
 from openpyxl.utils.cell import get_column_letter
 from datetime import datetime
-from settings import *
+import pandas as pd
+from excel_writer import SheetLayout
+from schema import apply_schema
+from long_table import to_long
+from sidecar import read_sidecar
+from allocation import allocate_charges, build_phase_fraction_index
 
 
 def read_DCCS(excel_file_path):
@@ -25,7 +37,7 @@ def read_DCCS(excel_file_path):
         print(f"Error:", e)
 
 
-def read_day_fraction(excel_file_path=TODAY_DCCS_DIR):
+def read_day_fraction(excel_file_path):
     try:
         sheet_name = 'Day Fraction by Phase'
         wb = openpyxl.load_workbook(filename=excel_file_path, data_only=True)
@@ -43,82 +55,79 @@ def first_datetime_column(df):
     return next((col for col in df.columns if pd.to_datetime(col, errors='coerce') is not pd.NaT), None)
 
 
-# Load TODAY's DCCS.
-df_DCCS = read_DCCS(TODAY_DCCS_DIR)
-# Unpivot date columns.
-df_DCCS_melted = pd.melt(df_DCCS,
-                         id_vars=df_DCCS.columns[:df_DCCS.columns.get_loc(first_datetime_column(df_DCCS))],
-                         var_name='Date', value_name='Quantity')
-# Remove unnecessary rows and columns.
-df_DCCS_melted = df_DCCS_melted.replace({pd.np.nan: 0})
-df_DCCS_melted = df_DCCS_melted[df_DCCS_melted['Quantity'] != 0]
-df_DCCS_melted.drop(columns=['Daily Estimate (USD)', 'Charging Mechanism', 'Total Cost (USD)', 'Total Units'],
-                    inplace=True)
-df_DCCS_melted.reset_index(inplace=True, drop=True)
-# Generate daily line cost.
-df_DCCS_melted['Daily Line Cost (USD)'] = df_DCCS_melted.apply(
-    lambda row: row['Quantity'] * row['SAP Unit Price'] / (1 if row['Currency'] == "USD" else USDMYR), axis=1)
-
-# Load TODAY's day fraction generated from lookahead.
-df_day_fraction = read_day_fraction()
-# Unpivot date columns.
-df_day_fraction_melted = pd.melt(df_day_fraction,
-                                 id_vars=df_day_fraction.columns[
-                                         :df_day_fraction.columns.get_loc(first_datetime_column(df_day_fraction))],
-                                 var_name='Date', value_name='Day Fraction')
-# Remove unnecessary rows and columns.
-df_day_fraction_melted = df_day_fraction_melted[df_day_fraction_melted['Day Fraction'] != 0]
-df_day_fraction_melted.drop(columns=['Projection Start Time', 'Projection End Time', 'AFE Time', 'AFE Cost',
-                                     'Actual Time', 'Days Ahead/Behind', 'Planned Depth'], inplace=True)
-df_day_fraction_melted.reset_index(inplace=True, drop=True)
-# Generate day fraction by Event.
-df_day_fraction_melted['Day Fraction by Event'] = df_day_fraction_melted['Day Fraction'] / df_day_fraction_melted.groupby(['Well Name', 'Event', 'Date'])['Day Fraction'].transform('sum')
-
-# Generate Phase Code for each DCCS row.
-df_DCCS_expanded = pd.merge(df_DCCS.drop(columns=['Daily Estimate (USD)', 'Total Cost (USD)', 'Total Units']),
-                            df_AFE[['Well Name', 'Event', 'Phase Code']],
-                            left_on=['Well Name', 'Event'],
-                            right_on=['Well Name', 'Event'],
-                            how='left')
-# Remove unnecessary datetime columns.
-df_DCCS_expanded = df_DCCS_expanded.loc[:, ~pd.to_datetime(df_DCCS_expanded.columns, errors='coerce').notna()]
-# Generate date and day fraction for each Phase Code.
-df_DCCS_expanded = pd.merge(df_DCCS_expanded, df_day_fraction_melted,
-                            left_on=['Well Name', 'Phase Code', 'Event'],
-                            right_on=['Well Name', 'Phase Code', 'Event'], how='left')
-# Generate daily line cost for each date.
-df_DCCS_expanded = pd.merge(df_DCCS_expanded,
-                            df_DCCS_melted[['Well Name', 'Event', 'OCS Number', 'Item Number', 'Description',
-                                            'Date', 'Quantity', 'Daily Line Cost (USD)']],
-                            on=['Well Name', 'Event', 'OCS Number', 'Item Number', 'Description', 'Date'],
-                            how='left')
-# Remove unnecessary rows.
-df_DCCS_expanded = df_DCCS_expanded.replace({pd.np.nan: 0})
-df_DCCS_expanded = df_DCCS_expanded[df_DCCS_expanded["Quantity"] != 0]
-df_DCCS_expanded.reset_index(inplace=True, drop=True)
-# Generate line cost for each date.  # TODO: - If cost is tagged to a Phase, check against Phase and carry full cost.
-df_DCCS_expanded['Line Cost (USD)'] = df_DCCS_expanded['Daily Line Cost (USD)'] * df_DCCS_expanded['Day Fraction by Event']
-
-# Label Actual or Projected based on date.
-df_DCCS_expanded['Actual/Projected'] = df_DCCS_expanded.apply(
-    lambda row: 'Actual' if row['Date'] < TODAY.date() else 'Projected', axis=1)
-
-# Export Performance Tracker to EXCEL.
-with pd.ExcelWriter(TODAY_DCCS_DIR, mode='a', engine="openpyxl") as writer:
-    df_DCCS_expanded.to_excel(writer, sheet_name='DCCS Expanded', index=False, freeze_panes=(1, 0))
-
-# Open Performance Tracker tab in EXCEL.
-wb = openpyxl.load_workbook(TODAY_DCCS_DIR)
-ws = wb['DCCS Expanded']
-
-# Configure formatting.
-for i, header in enumerate(list(df_DCCS_expanded.columns)):
-    if header in ['Description', 'Phase']:
-        ws.column_dimensions[get_column_letter(i + 1)].width = 40
-    if header == 'Date':
-        ws.column_dimensions[get_column_letter(i + 1)].width = 13
-ws.auto_filter.ref = f'A1:{get_column_letter(ws.max_column)}1'
-
-# Save workbook.
-wb.save(TODAY_DCCS_DIR)
-wb.close()
+# Split a wide table into its row metadata and a long table of its non-zero date cells.
+def split_dates(df, value_name):
+    date_columns = list(df.columns[df.columns.get_loc(first_datetime_column(df)):])
+    return df.drop(columns=date_columns), to_long(df, date_columns, value_name)
+
+
+# Load the DCCS rows, charges, phases and day fraction of a DCCS workbook, from its sidecar if there is one.
+def load_tables(excel_file_path):
+    tables = read_sidecar(excel_file_path)
+    if tables is not None:
+        print(f"[INFO] Performance tracker: tables read from the sidecar of {excel_file_path.name}")
+        return tables['DCCS'], tables['charges'], tables['phases'], tables['day_fraction']
+    df_DCCS, df_day_fraction_wide = read_DCCS(excel_file_path), read_day_fraction(excel_file_path)
+    if df_DCCS is None or df_day_fraction_wide is None:
+        raise ValueError(f"{excel_file_path} has no readable DCCS and Day Fraction by Phase tabs")
+    df_DCCS, df_charges = split_dates(df_DCCS, 'Quantity')
+    grouped_df, df_day_fraction = split_dates(df_day_fraction_wide, 'Day Fraction')
+    print(f"[INFO] Performance tracker: tables read from {excel_file_path.name} (no sidecar)")
+    return apply_schema(df_DCCS), df_charges, apply_schema(grouped_df), df_day_fraction
+
+
+def tracker_path(excel_file_path):
+    return excel_file_path.with_name(excel_file_path.stem + '.tracker.xlsx')
+
+
+# Columns of grouped_df carried to DCCS Expanded.
+def tracker_phase_columns(grouped_df):
+    return [col for col in grouped_df.columns if col not in [
+        'Projection Start Time', 'Projection End Time', 'AFE Time', 'AFE Cost', 'Actual Time', 'Days Ahead/Behind',
+        'Planned Depth']]
+
+
+# Expand each DCCS row to its phases and dates, with line cost split by day fraction by Event.
+# df_DCCS are DCCS rows without date columns, df_charges their long table of (Row, Date, Quantity).
+# grouped_df are phases grouped by well phase, df_day_fraction their long table of (Row, Date, Day Fraction).
+def expand_DCCS(df_DCCS, df_charges, grouped_df, df_day_fraction, df_AFE, fx_table, today):
+    df_DCCS = df_DCCS.drop(columns=['Daily Estimate (USD)', 'Total Cost (USD)', 'Total Units'],
+                           errors='ignore').reset_index(drop=True)
+
+    # Join non-zero charges to DCCS rows.
+    df_lines = df_charges[df_charges['Quantity'] != 0].join(df_DCCS, on='Row')
+    # Generate daily line cost, at the FX rate of the date for actual days and of Today for projected days.
+    df_lines['Daily Line Cost (USD)'] = fx_table.to_usd(
+        df_lines['Quantity'] * pd.to_numeric(df_lines['SAP Unit Price']).fillna(0), df_lines['Currency'],
+        df_lines['Date'], today=today)
+    df_lines = df_lines.replace({np.nan: 0})
+
+    # Index day fraction by Event of phases by Well Event and date, for Phase Codes of the Well Event in the AFE.
+    phase_columns = tracker_phase_columns(grouped_df)
+    df_index = build_phase_fraction_index(grouped_df, df_day_fraction, df_AFE, phase_columns)
+
+    # Allocate each charge to the phases active on its date.
+    df_DCCS_expanded = allocate_charges(df_lines, df_index)
+    phase_details = [col for col in phase_columns if col not in ['Well Name', 'Event', 'Phase Code']]
+    df_DCCS_expanded = df_DCCS_expanded[list(df_DCCS.columns) + ['Phase Code'] + phase_details + [
+        'Date', 'Day Fraction', 'Day Fraction by Event', 'Quantity', 'Daily Line Cost (USD)']]
+    df_DCCS_expanded = df_DCCS_expanded.replace({np.nan: 0})
+    df_DCCS_expanded['Date'] = df_DCCS_expanded['Date'].dt.date
+    # Generate line cost for each date.  # TODO: - If cost is tagged to a Phase, check against Phase and carry full cost.
+    df_DCCS_expanded['Line Cost (USD)'] = df_DCCS_expanded['Daily Line Cost (USD)'] * df_DCCS_expanded['Day Fraction by Event']
+
+    # Label Actual or Projected based on date.
+    df_DCCS_expanded['Actual/Projected'] = np.where(df_DCCS_expanded['Date'] < today.date(), 'Actual', 'Projected')
+    return df_DCCS_expanded
+
+
+# Configure Performance Tracker tab formatting.
+def DCCS_expanded_layout(df_DCCS_expanded):
+    layout = SheetLayout('DCCS Expanded', df_DCCS_expanded, freeze_panes='A2',
+                         auto_filter=f'A1:{get_column_letter(df_DCCS_expanded.shape[1])}1')
+    for i, header in enumerate(list(df_DCCS_expanded.columns)):
+        if header in ['Description', 'Phase']:
+            layout.column_widths[i + 1] = 40
+        if header == 'Date':
+            layout.column_widths[i + 1] = 13
+    return layout
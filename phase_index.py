@@ -0,0 +1,103 @@
+# Methods to look up projected phases by time, well and phase.
+
+# Proposed workflow:
+# - Build a PhaseIndex once per lookahead from grouped_df.
+# - Window of a well phase: hash map of (Well Name, Phase Code) to its first projection window.
+# - Phases active at a time, wells and Well Events active on a date: intervals sorted by (key, start) with the running
+#   maximum end per key, searched with a binary search instead of a mask over all phases.
+
+# Times are in whole seconds, as projection times are rounded to the second.
+
+import numpy as np
+import pandas as pd
+
+KEY_OFFSET = 1 << 40  # Seconds, keeps each key's times in its own range of the sorted keys.
+DAY = 24 * 60 * 60
+
+
+# Seconds since epoch of datetime-like values as int64.
+def to_seconds(times):
+    return np.asarray(pd.to_datetime(times), dtype='datetime64[ns]').astype('datetime64[s]').astype('int64')
+
+
+# Non-empty intervals sorted by (key, start). Answers which intervals of a key overlap [low, high) in O(log n).
+class SortedIntervals:
+    def __init__(self, keys, starts, ends):
+        order = np.lexsort((starts, keys))
+        order = order[starts[order] < ends[order]]
+        self.positions = order
+        self.keys = keys[order]
+        self.sorted_keys = self.keys * KEY_OFFSET + starts[order]
+        self.ends = ends[order]
+        # Running maximum of ends within each key, so that no earlier interval of the key ends after it.
+        self.max_ends = pd.Series(self.ends).groupby(self.keys).cummax().to_numpy()
+
+    # Index of the last interval of each key starting before high, -1 if none.
+    def last_before(self, keys, highs):
+        if not len(self.sorted_keys):
+            return np.full(len(keys), -1)
+        i = np.searchsorted(self.sorted_keys, keys * KEY_OFFSET + highs, side='left') - 1
+        found = (i >= 0) & (self.keys[np.maximum(i, 0)] == keys)
+        return np.where(found, i, -1)
+
+    # Whether any interval of each key overlaps [low, high).
+    def any_overlap(self, keys, lows, highs):
+        i = self.last_before(keys, highs)
+        return (i >= 0) & (self.max_ends[np.maximum(i, 0)] > lows)
+
+    # Positions of intervals of key overlapping [low, high), in position order.
+    def overlapping(self, key, low, high):
+        i = self.last_before(np.array([key]), np.array([high]))[0]
+        positions = []
+        while i >= 0 and self.keys[i] == key and self.max_ends[i] > low:
+            if self.ends[i] > low:
+                positions.append(self.positions[i])
+            i -= 1
+        return sorted(positions)
+
+
+class PhaseIndex:
+    def __init__(self, grouped_df):
+        self.grouped_df = grouped_df.reset_index(drop=True)
+        self.windows = {}
+        for key in zip(grouped_df['Well Name'], grouped_df['Phase Code'],
+                       grouped_df['Projection Start Time'], grouped_df['Projection End Time']):
+            self.windows.setdefault(key[:2], key[2:])
+        starts = to_seconds(grouped_df['Projection Start Time'])
+        ends = to_seconds(grouped_df['Projection End Time'])
+        self.wells = pd.Index(pd.unique(grouped_df['Well Name']))
+        self.events = pd.MultiIndex.from_arrays([grouped_df['Well Name'], grouped_df['Event']]).unique()
+        self.by_time = SortedIntervals(np.zeros(len(starts), dtype='int64'), starts, ends)
+        self.by_well = SortedIntervals(self.wells.get_indexer(grouped_df['Well Name']), starts, ends)
+        self.by_event = SortedIntervals(self.event_codes(grouped_df['Well Name'], grouped_df['Event']), starts, ends)
+
+    def event_codes(self, wells, events):
+        return self.events.get_indexer(pd.MultiIndex.from_arrays([list(wells), list(events)])).astype('int64')
+
+    # (Projection Start Time, Projection End Time) of the first phase of Phase Code of well. Raises KeyError.
+    def window(self, well, phase_code):
+        return self.windows[(well, phase_code)]
+
+    # grouped_df positions of phases active at time.
+    def phases_at(self, time):
+        second = to_seconds([time])[0]
+        return self.by_time.overlapping(0, second, second + 1)
+
+    # Wells with a phase active on date, in grouped_df order.
+    def wells_on(self, date):
+        low = to_seconds([pd.Timestamp(date).normalize()])[0]
+        positions = self.by_time.overlapping(0, low, low + DAY)
+        return list(pd.unique(self.grouped_df['Well Name'].to_numpy()[positions]))
+
+    # Whether well is active on date.
+    def well_active(self, well, date):
+        if well not in self.wells:
+            return False
+        low = to_seconds([pd.Timestamp(date).normalize()])
+        return bool(self.by_well.any_overlap(np.array([self.wells.get_loc(well)]), low, low + DAY)[0])
+
+    # Whether each (Well Name, Event) has a phase active on each date (arrays of equal length).
+    def events_active(self, wells, events, dates):
+        codes = self.event_codes(wells, events)
+        lows = to_seconds(pd.DatetimeIndex(dates).normalize())
+        return (codes >= 0) & self.by_event.any_overlap(np.maximum(codes, 0), lows, lows + DAY)
@@ -0,0 +1,323 @@
+# Methods to run the DCCS generator as a pipeline of lazy, memoized stages.
+
+# Proposed workflow:
+# - Create a Pipeline with the settings module (settings.py unless given, imported on first use).
+# - Ask for the result of any stage, e.g. pipeline.grouped_df(). Only the stages it depends on are run.
+# - Each stage runs at most once per Pipeline, its result is kept for the stages that follow.
+# - Run the export stage to generate Today's DCCS, with the performance tracker written in the same pass.
+# - Optionally record each stage with a StageProfiler (settings.PROFILE, settings.PROFILE_STAGE).
+# - Count the inputs that failed in each stage in pipeline.failures: OCS files not read, DCCS rows not charged,
+#   manual inputs not read.
+# - When an input changes, invalidate the stage reading it: it and the stages depending on it run again when asked
+#   for, the others are kept (see watch.py).
+
+# Stages (in dependency order):
+# - read_lookahead: lookahead table of the latest lookahead (from the parse cache if unchanged).
+# - project: lookahead with Projection Start Time and Projection End Time.
+# - well_date_range: dates from the first to the last projected well phase.
+# - grouped_df: performance tracker grouped by well phase, with AFE Cost and Event.
+# - day_fractions: long table of (Row, Date, Day Fraction) by grouped_df row.
+# - phase_index: lookups of phase windows and of phases, wells and Well Events active by time or date.
+# - ingest_OCS: (OCS rows, failed files) of all OCS in OCS_DIR.
+# - expand_tariffs: OCS rows with tariffs generated per Well Event.
+# - DCCS_rows: DCCS rows without date columns.
+# - charge: (long table of (Row, Date, Quantity) by DCCS row, charge state for the next run).
+# - manual_inputs: (uid, Date, Quantity) before the cut-off date from the manual input store.
+# - merge_manual_inputs: charges with manual inputs before the cut-off date.
+# - fx_table: dated FX rates to convert costs to USD.
+# - tracker_tables: DCCS rows, charges, phases and day fraction of this run, or of Today's DCCS already exported (its
+#   sidecar, or the workbook) if settings.TRACKER_FROM_EXPORT.
+# - performance_tracker: DCCS Expanded from the tracker tables. If settings.TRACKER_FROM_EXPORT, written next to
+#   Today's DCCS as <stem>.tracker.xlsx, without ingesting OCS or charging.
+# - export: path of Today's DCCS, with DCCS, Day Fraction by Phase and DCCS Expanded tabs written in one pass (and
+#   its sidecar if settings.SIDECAR). Totals and daily costs are EXCEL formulas, or values if settings.EXPORT_VALUES
+#   (opens without recalculation).
+# - rollup: cost cube by well, event, phase, cost group, vendor, currency, date and actual/projected (if
+#   settings.ROLLUP), next to Today's DCCS. Only dates whose inputs changed since the previous cube are expanded and
+#   summed again.
+# - archive: Today's charges and phase projection added to the Parquet archive of settings.ARCHIVE_DIR (if set).
+# - scenarios: daily cost per well of settings.SCENARIOS compared with Base (if any), next to Today's DCCS.
+# - monte_carlo: (P10/P50/P90 cost and finish by well, cumulative cost by well and date) if
+#   settings.MONTE_CARLO_SAMPLES, next to Today's DCCS.
+
+import functools
+import importlib
+import pandas as pd
+import lookahead
+import OCS
+import DCCS
+import performance_tracker
+from archive import charge_lines, write_archive
+from cache import get_parse_cache
+from currency import load_fx_table
+from charging import read_charge_state, write_charge_state
+from excel_writer import write_workbook
+from forecast import forecast_layouts, forecast_path, forecast_well_costs
+from ingest import ingest_OCS
+from profiling import StageProfiler
+from rollup import read_rollup, refresh_rollup, write_rollup
+from phase_index import PhaseIndex
+from manual_inputs import ManualInputStore, apply_manual_inputs, manual_input_cutoff, manual_input_store_path
+from scenarios import run_scenarios, scenarios_layout, scenarios_path
+from sidecar import remove_sidecar, write_sidecar
+
+STAGES = []
+
+
+# Register a Pipeline method as a stage, evaluated on first call and memoized.
+def stage(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self):
+        if self.running:
+            self.dependents.setdefault(name, set()).add(self.running[-1])
+        if name not in self.results:
+            self.running.append(name)
+            try:
+                if self.profiler is None:
+                    self.results[name] = method(self)
+                else:
+                    self.results[name] = self.profiler.run(name, functools.partial(method, self))
+            finally:
+                self.running.pop()
+        elif self.profiler is not None:
+            self.profiler.used(self.results[name])
+        return self.results[name]
+
+    STAGES.append(name)
+    return wrapper
+
+
+class Pipeline:
+    # If settings.PROFILE or settings.PROFILE_STAGE, stages are recorded by a StageProfiler unless one is given.
+    def __init__(self, settings=None, profiler=None):
+        self.settings = settings if settings is not None else importlib.import_module('settings')
+        self.results = {}
+        self.previous_results = {}  # Results of invalidated stages.
+        self.dependents = {}  # {stage: stages that asked for its result}
+        self.running = []
+        self.failures = {}  # {stage: number of inputs that failed, e.g. OCS files not read or DCCS rows not charged}
+        profile_stage = getattr(self.settings, 'PROFILE_STAGE', None)
+        if profiler is None and (getattr(self.settings, 'PROFILE', False) or profile_stage):
+            profiler = StageProfiler(cache=get_parse_cache(self.settings), profile_stage=profile_stage)
+        self.profiler = profiler
+
+    @stage
+    def read_lookahead(self):
+        return get_parse_cache(self.settings).read(lookahead.read_lookahead, self.settings.LATEST_LOOKAHEAD_DIR)
+
+    @stage
+    def project(self):
+        return lookahead.project_lookahead(self.read_lookahead())
+
+    @stage
+    def well_date_range(self):
+        return lookahead.calc_well_date_range(self.project())
+
+    @stage
+    def grouped_df(self):
+        return lookahead.group_by_phase(self.project(), self.settings.df_AFE)
+
+    @stage
+    def day_fractions(self):
+        return lookahead.build_day_fractions(self.grouped_df(), self.well_date_range())
+
+    @stage
+    def phase_index(self):
+        return PhaseIndex(self.grouped_df())
+
+    @stage
+    def ingest_OCS(self):
+        df_OCS, df_errors = ingest_OCS(self.settings.OCS_DIR.iterdir(), jobs=getattr(self.settings, 'OCS_JOBS', 1),
+                                       cache=get_parse_cache(self.settings))
+        self.failures['ingest_OCS'] = len(df_errors)
+        return df_OCS, df_errors
+
+    @stage
+    def expand_tariffs(self):
+        df_OCS, _ = self.ingest_OCS()
+        return OCS.generate_OCS_rows(df_OCS, self.settings.df_AFE)
+
+    @stage
+    def DCCS_rows(self):
+        return DCCS.generate_DCCS_rows(self.expand_tariffs())
+
+    # If settings.INCREMENTAL_CHARGING, only recharge rows whose inputs changed since the latest DCCS.
+    # If invalidated, only recharge rows whose inputs changed since the previous charge.
+    @stage
+    def charge(self):
+        previous_state = None
+        if 'charge' in self.previous_results:  # Invalidated, only recharge rows whose inputs changed since.
+            previous_state = self.previous_results['charge'][1]
+        elif getattr(self.settings, 'INCREMENTAL_CHARGING', False):
+            previous_state = read_charge_state(self.settings.LATEST_DCCS_DIR)
+        df_charges, state = DCCS.charge_DCCS(self.DCCS_rows(), self.grouped_df(), self.day_fractions(),
+                                             self.well_date_range(), previous_state=previous_state,
+                                             verify=getattr(self.settings, 'INCREMENTAL_VERIFY', False),
+                                             phase_index=self.phase_index())
+        self.failures['charge'] = state['errors']['Row'].nunique()
+        return df_charges, state
+
+    # Harvest the latest DCCS into the manual input store (once per workbook), then read stored manual inputs.
+    @stage
+    def manual_inputs(self):
+        cutoff_date = manual_input_cutoff(self.settings.TODAY)
+        df_manual = pd.DataFrame({'uid': pd.Series(dtype=object), 'Date': pd.Series(dtype='datetime64[ns]'),
+                                  'Quantity': pd.Series(dtype=float)})
+        store = ManualInputStore(manual_input_store_path(self.settings))
+        try:
+            latest_DCCS_path = self.settings.LATEST_DCCS_DIR
+            if latest_DCCS_path.exists() and not store.is_harvested(latest_DCCS_path):
+                df_old_DCCS = get_parse_cache(self.settings).read(DCCS.read_DCCS, latest_DCCS_path)
+                n_cells = store.harvest(df_old_DCCS, latest_DCCS_path.name)
+                store.mark_harvested(latest_DCCS_path)
+                print(f"[INFO] Manual input store: {n_cells} cells harvested from {latest_DCCS_path.name}.")
+            df_manual = store.read(self.well_date_range()[0], cutoff_date)
+        except Exception as e:
+            print("Error:", e)
+            self.failures['manual_inputs'] = 1
+        finally:
+            store.close()
+        return df_manual
+
+    @stage
+    def merge_manual_inputs(self):
+        df_charges, _ = self.charge()
+        df_charges, n_overrides = apply_manual_inputs(self.DCCS_rows(), df_charges, self.manual_inputs(),
+                                                      self.well_date_range())
+        print(f"[INFO] Manual input store: {n_overrides} cells before "
+              f"{manual_input_cutoff(self.settings.TODAY).date()} applied.")
+        return df_charges
+
+    @stage
+    def fx_table(self):
+        return load_fx_table(self.settings)
+
+    # Tables of Today's DCCS already exported if settings.TRACKER_FROM_EXPORT (for runs without the export stage).
+    @stage
+    def tracker_tables(self):
+        if getattr(self.settings, 'TRACKER_FROM_EXPORT', False):
+            return performance_tracker.load_tables(self.settings.TODAY_DCCS_DIR)
+        return (DCCS.exported_DCCS_rows(self.DCCS_rows()), self.merge_manual_inputs(), self.grouped_df(),
+                self.day_fractions())
+
+    @stage
+    def performance_tracker(self):
+        df_DCCS_expanded = performance_tracker.expand_DCCS(*self.tracker_tables(), self.settings.df_AFE,
+                                                           self.fx_table(), self.settings.TODAY)
+        if getattr(self.settings, 'TRACKER_FROM_EXPORT', False):
+            excel_file_path = performance_tracker.tracker_path(self.settings.TODAY_DCCS_DIR)
+            write_workbook(excel_file_path, [performance_tracker.DCCS_expanded_layout(df_DCCS_expanded)])
+            print(f"[INFO] DCCS Expanded of {self.settings.TODAY_DCCS_DIR.name} written to {excel_file_path.name}")
+        return df_DCCS_expanded
+
+    @stage
+    def export(self):
+        excel_file_path = self.settings.TODAY_DCCS_DIR
+        active_well = DCCS.find_active_well(self.phase_index(), self.settings.TODAY)
+        daily_costs = None
+        if getattr(self.settings, 'EXPORT_VALUES', False):
+            df_DCCS, daily_costs = DCCS.build_DCCS_values_sheet(self.DCCS_rows(), self.merge_manual_inputs(),
+                                                                self.well_date_range(), self.settings.TODAY,
+                                                                active_well, self.fx_table())
+        else:
+            df_DCCS = DCCS.build_DCCS_sheet(self.DCCS_rows(), self.merge_manual_inputs(), self.well_date_range())
+        write_workbook(excel_file_path, [
+            DCCS.DCCS_layout(df_DCCS, self.settings.TODAY, active_well, self.current_rate('MYR'),
+                             daily_costs=daily_costs),
+            DCCS.day_fraction_layout(self.grouped_df(), self.day_fractions(), self.well_date_range()),
+            performance_tracker.DCCS_expanded_layout(self.performance_tracker())])
+        if getattr(self.settings, 'INCREMENTAL_CHARGING', False):
+            write_charge_state(excel_file_path, self.charge()[1])
+        if getattr(self.settings, 'SIDECAR', False):
+            write_sidecar(excel_file_path, {'DCCS': DCCS.exported_DCCS_rows(self.DCCS_rows()),
+                                            'charges': self.merge_manual_inputs(), 'phases': self.grouped_df(),
+                                            'day_fraction': self.day_fractions()})
+        else:
+            remove_sidecar(excel_file_path)
+        return excel_file_path
+
+    # Roll up the tracker tables into a cost cube (if settings.ROLLUP), from the previous cube of this pipeline if
+    # invalidated, of the latest DCCS otherwise.
+    @stage
+    def rollup(self):
+        if not getattr(self.settings, 'ROLLUP', False):
+            return None
+        previous = self.previous_results.get('rollup') or read_rollup(self.settings.LATEST_DCCS_DIR)
+        df_cube, digests = refresh_rollup(*self.tracker_tables(), self.settings.df_AFE, self.fx_table(),
+                                          self.settings.TODAY, previous)
+        write_rollup(self.settings.TODAY_DCCS_DIR, df_cube, digests)
+        return df_cube, digests
+
+    # Snapshot Today's charges and phase projection in settings.ARCHIVE_DIR (if set), replacing any of Today.
+    @stage
+    def archive(self):
+        archive_dir = getattr(self.settings, 'ARCHIVE_DIR', None)
+        if archive_dir is None:
+            return None
+        write_archive(archive_dir, self.settings.TODAY, {
+            'charges': charge_lines(self.DCCS_rows(), self.merge_manual_inputs(), self.fx_table(), self.settings.TODAY),
+            'phases': self.grouped_df()})
+        print(f"[INFO] Snapshot of {self.settings.TODAY.date()} archived in {archive_dir}")
+        return archive_dir
+
+    # Compare settings.SCENARIOS with Base, sharing this run's lookahead, DCCS rows and manual inputs.
+    @stage
+    def scenarios(self):
+        if not getattr(self.settings, 'SCENARIOS', None):
+            return None
+        df_scenarios = run_scenarios(self.settings.SCENARIOS, self.read_lookahead(), self.settings.df_AFE,
+                                     self.DCCS_rows(), self.manual_inputs(), self.fx_table(), self.settings.TODAY,
+                                     jobs=getattr(self.settings, 'SCENARIO_JOBS', 1))
+        excel_file_path = scenarios_path(self.settings.TODAY_DCCS_DIR)
+        write_workbook(excel_file_path, [scenarios_layout(df_scenarios)])
+        print(f"[INFO] {len(self.settings.SCENARIOS)} scenarios compared in {excel_file_path.name}")
+        return df_scenarios
+
+    # Forecast cost and finish date percentiles per well from settings.MONTE_CARLO_SAMPLES samples (if set).
+    @stage
+    def monte_carlo(self):
+        n_samples = getattr(self.settings, 'MONTE_CARLO_SAMPLES', None)
+        if not n_samples:
+            return None
+        df_summary, df_curves = forecast_well_costs(
+            self.project(), self.grouped_df(), self.DCCS_rows(), self.merge_manual_inputs(), self.fx_table(),
+            self.settings.TODAY, n_samples,
+            distribution=getattr(self.settings, 'MONTE_CARLO_DISTRIBUTION', 'triangular'),
+            seed=getattr(self.settings, 'MONTE_CARLO_SEED', None))
+        excel_file_path = forecast_path(self.settings.TODAY_DCCS_DIR)
+        write_workbook(excel_file_path, forecast_layouts(df_summary, df_curves))
+        print(f"[INFO] Forecast of {n_samples} samples written to {excel_file_path.name}")
+        return df_summary, df_curves
+
+    # Today's rate of currency per USD, USDMYR if the FX table has no rate for currency.
+    def current_rate(self, currency):
+        if currency not in self.fx_table().currencies:
+            return self.settings.USDMYR
+        return float(self.fx_table().rate([currency], [self.settings.TODAY])[0])
+
+    # Forget the results of stages and of all stages depending on them, so that they run again when asked for.
+    # Returns the names of forgotten stages.
+    def invalidate(self, *stages):
+        forgotten = set()
+        stack = list(stages)
+        while stack:
+            name = stack.pop()
+            if name in forgotten:
+                continue
+            forgotten.add(name)
+            if name in self.results:
+                self.previous_results[name] = self.results.pop(name)
+            self.failures.pop(name, None)
+            stack.extend(self.dependents.get(name, ()))
+        return forgotten
+
+    # Run stages by name (all stages by default) and return their results.
+    def run(self, *stages):
+        results = {name: getattr(self, name)() for name in stages or STAGES}
+        print(f"[INFO] {get_parse_cache(self.settings).summary()}")
+        if self.profiler is not None:
+            print(self.profiler.summary())
+            self.profiler.write(self.settings.TODAY_DCCS_DIR)
+        return results
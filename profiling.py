@@ -0,0 +1,114 @@
+# Methods to instrument pipeline stages.
+
+# Proposed workflow:
+# - Wrap each stage run: wall time, CPU time, peak RSS, input/output rows and parse cache hits/misses.
+# - Input rows of a stage are the output rows of the stages it reads (run or memoized).
+# - Self time excludes stages run from within the stage.
+# - Optionally run one stage under cProfile, dumping stats next to the DCCS and printing the top functions.
+# - Write a JSON report next to the DCCS at the end of the run.
+
+# Settings (optional):
+# - PROFILE: record stages and write <stem>.profile.json next to Today's DCCS.
+# - PROFILE_STAGE: name of a stage to run under cProfile, dumped to <stem>.<stage>.prof.
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+# Peak resident set size of the process so far, in MB (None if unknown).
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+# Number of rows of a stage result (of the first item of a tuple), None if it has no length.
+def count_rows(result):
+    if isinstance(result, tuple):
+        result = result[0] if result else None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class StageProfiler:
+    def __init__(self, cache=None, profile_stage=None):
+        self.cache = cache
+        self.profile_stage = profile_stage
+        self.profile = None  # (stage, cProfile.Profile) of the profiled stage.
+        self.records = []
+        self.stack = []
+        self.started = datetime.now()
+
+    def cache_counts(self):
+        if self.cache is None:
+            return 0, 0
+        return self.cache.hits, self.cache.misses
+
+    # Count the rows of a memoized stage result as input of the running stage.
+    def used(self, result):
+        if self.stack:
+            self.stack[-1]['input_rows'] += count_rows(result) or 0
+
+    # Run a stage function and record it.
+    def run(self, name, function):
+        frame = {'input_rows': 0, 'child_wall': 0.0, 'child_cpu': 0.0}
+        self.stack.append(frame)
+        hits, misses = self.cache_counts()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            if name == self.profile_stage:
+                profiler = cProfile.Profile()
+                result = profiler.runcall(function)
+                self.profile = (name, profiler)
+            else:
+                result = function()
+        finally:
+            self.stack.pop()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        end_hits, end_misses = self.cache_counts()
+        self.records.append({
+            'stage': name, 'wall_seconds': wall, 'self_wall_seconds': wall - frame['child_wall'],
+            'cpu_seconds': cpu, 'self_cpu_seconds': cpu - frame['child_cpu'], 'peak_rss_mb': peak_rss_mb(),
+            'input_rows': frame['input_rows'], 'output_rows': count_rows(result),
+            'cache_hits': end_hits - hits, 'cache_misses': end_misses - misses})
+        if self.stack:
+            self.stack[-1]['child_wall'] += wall
+            self.stack[-1]['child_cpu'] += cpu
+        self.used(result)
+        return result
+
+    def report(self):
+        return {'started': self.started.isoformat(), 'profiled_stage': self.profile_stage,
+                'total_wall_seconds': sum(record['self_wall_seconds'] for record in self.records),
+                'stages': self.records}
+
+    # Write the JSON report (and cProfile stats of the profiled stage) next to excel_file_path.
+    def write(self, excel_file_path):
+        report_path = excel_file_path.with_name(excel_file_path.stem + '.profile.json')
+        report_path.write_text(json.dumps(self.report(), indent=2))
+        print(f"[INFO] Stage profile written to {report_path.name}")
+        if self.profile is not None:
+            name, profiler = self.profile
+            stats_path = excel_file_path.with_name(f'{excel_file_path.stem}.{name}.prof')
+            profiler.dump_stats(stats_path)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(20)
+            print(f"[INFO] cProfile of stage {name} written to {stats_path.name}\n{stream.getvalue()}")
+
+    def summary(self):
+        return '\n'.join(f"[INFO] Stage {record['stage']}: {record['self_wall_seconds']:.3f}s wall, "
+                         f"{record['self_cpu_seconds']:.3f}s CPU, {record['input_rows']} rows in, "
+                         f"{record['output_rows']} rows out" for record in self.records)
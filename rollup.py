@@ -0,0 +1,157 @@
+# Methods to roll up line costs of the performance tracker into a cost cube, refreshed incrementally.
+
+# Proposed workflow:
+# - Sum Line Cost (USD) of DCCS Expanded by well, event, phase, cost group, vendor, currency, date and
+#   actual/projected: one cube cell per combination present.
+# - Digest the inputs of each date from the tracker tables, before expansion: its charges (with a hash of their DCCS
+#   row), its day fractions (with a hash of their phase), the FX rates it is priced at, Actual/Projected and the AFE.
+# - On the next run (or the next regeneration in watch mode), only expand and sum the dates whose digest changed;
+#   cells of other dates are taken from the previous cube as they are, their lines are never expanded or hashed.
+# - Write the cube as a compact sheet (<stem>.rollup.xlsx) and as Parquet (<stem>.rollup.parquet) for dashboards,
+#   next to Today's DCCS. The Parquet file carries the digests, the previous one is read next to the latest DCCS.
+
+# Settings (optional):
+# - ROLLUP: materialize the cube, not done if not set.
+
+import json
+import numpy as np
+import pandas as pd
+from openpyxl.utils.cell import get_column_letter
+from excel_writer import SheetLayout, write_workbook
+from performance_tracker import expand_DCCS, tracker_phase_columns
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # Optional dependency, no Parquet file is written and every run sums all dates.
+    pyarrow = None
+
+ROLLUP_VERSION = 2
+DIMENSIONS = ['Well Name', 'Event', 'Phase Code', 'Phase', 'Cost Group', 'Vendor', 'Currency', 'Date',
+              'Actual/Projected']
+TEXT_DIMENSIONS = ['Well Name', 'Event', 'Phase', 'Cost Group', 'Vendor', 'Currency', 'Actual/Projected']
+MEASURE = 'Cost (USD)'
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def rollup_path(excel_file_path, suffix='.parquet'):
+    return excel_file_path.with_name(excel_file_path.stem + '.rollup' + suffix)
+
+
+# Text dimensions as strings, so that cells summed in different runs (or read back from Parquet) compare equal.
+def with_text_dimensions(df):
+    return df.astype({col: 'string' for col in TEXT_DIMENSIONS})
+
+
+# Dimensions and line cost of DCCS Expanded, with Date as datetime64[ns].
+def rollup_lines(df_DCCS_expanded):
+    df_lines = with_text_dimensions(df_DCCS_expanded[DIMENSIONS])
+    df_lines['Date'] = pd.to_datetime(df_lines['Date'])
+    df_lines[MEASURE] = df_DCCS_expanded['Line Cost (USD)'].to_numpy(dtype=float)
+    return df_lines
+
+
+# Hash of each line of equal-length columns, combined column by column.
+def line_hashes(*columns):
+    hashes = np.zeros(len(columns[0]), dtype='uint64')
+    for column in columns:
+        hashes = pd.util.hash_array(hashes * np.uint64(HASH_MULTIPLIER) + pd.util.hash_array(np.asarray(column)))
+    return hashes
+
+
+# Sum of hashes (modulo 2**64, independent of line order) by date, as a Series indexed by Date.
+def sum_by_date(hashes, dates):
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    order = np.argsort(dates, kind='stable')
+    unique_dates, starts = np.unique(dates[order], return_index=True)
+    sums = np.add.reduceat(hashes[order], starts) if len(order) else np.array([], dtype='uint64')
+    return pd.Series(sums, index=pd.DatetimeIndex(unique_dates, name='Date'), dtype='uint64')
+
+
+# Digest of the inputs of each date of the tracker tables. Rows and phases are hashed once, then each charge and day
+# fraction line as (row or phase hash, value): no DCCS Expanded line is built.
+def date_digests(df_DCCS, df_charges, grouped_df, df_day_fraction, df_AFE, fx_table, today):
+    row_hashes = pd.util.hash_pandas_object(df_DCCS.reset_index(drop=True), index=False).to_numpy()
+    phase_hashes = pd.util.hash_pandas_object(grouped_df[tracker_phase_columns(grouped_df)].reset_index(drop=True),
+                                              index=False).to_numpy()
+    charges = sum_by_date(line_hashes(row_hashes[df_charges['Row'].to_numpy()], df_charges['Quantity']),
+                          df_charges['Date'])
+    fractions = sum_by_date(line_hashes(phase_hashes[df_day_fraction['Row'].to_numpy()],
+                                        df_day_fraction['Day Fraction']), df_day_fraction['Date'])
+    dates = charges.index.union(fractions.index)
+    afe_hash = pd.util.hash_pandas_object(df_AFE[['Well Name', 'Event', 'Phase Code']], index=False).sum()
+    currencies = pd.unique(np.asarray(df_DCCS['Currency'], dtype=object))
+    rates = [fx_table.rate(np.repeat(currencies[[i]], len(dates)), dates, today=today) for i in range(len(currencies))]
+    digests = line_hashes(charges.reindex(dates, fill_value=0).to_numpy(dtype='uint64'),
+                          fractions.reindex(dates, fill_value=0).to_numpy(dtype='uint64'),
+                          dates < today.normalize(), np.full(len(dates), afe_hash, dtype='uint64'), *rates)
+    return pd.Series(digests, index=pd.DatetimeIndex(dates, name='Date'), dtype='uint64')
+
+
+# Sum line cost by all dimensions, keeping missing dimension values.
+def aggregate(df_lines):
+    return df_lines.groupby(DIMENSIONS, dropna=False, observed=True, as_index=False, sort=False)[MEASURE].sum()
+
+
+# Cube of the tracker tables (DCCS rows, charges, phases, day fraction) and its date digests. Only dates whose digest
+# changed since previous (cube, digests) are expanded and summed, the others keep the cells of the previous cube.
+def refresh_rollup(df_DCCS, df_charges, grouped_df, df_day_fraction, df_AFE, fx_table, today, previous=None):
+    digests = date_digests(df_DCCS, df_charges, grouped_df, df_day_fraction, df_AFE, fx_table, today)
+    changed = digests.index
+    df_kept = None
+    if previous is not None:
+        df_previous, previous_digests = previous
+        changed = digests.index[digests.ne(previous_digests.reindex(digests.index))]
+        df_kept = with_text_dimensions(df_previous[df_previous['Date'].isin(digests.index.difference(changed))])
+    df_DCCS_expanded = expand_DCCS(df_DCCS, df_charges[df_charges['Date'].isin(changed)], grouped_df,
+                                   df_day_fraction[df_day_fraction['Date'].isin(changed)], df_AFE, fx_table, today)
+    df_cube = pd.concat([df_kept, aggregate(rollup_lines(df_DCCS_expanded))], ignore_index=True)
+    df_cube = df_cube.sort_values(by=DIMENSIONS, ignore_index=True, kind='stable')
+    print(f"[INFO] Rollup: {len(changed)} of {len(digests)} dates refreshed, {len(df_cube)} cells.")
+    return df_cube, digests
+
+
+def write_rollup_parquet(parquet_path, df_cube, digests):
+    table = pyarrow.Table.from_pandas(df_cube, preserve_index=False)
+    metadata = {'version': ROLLUP_VERSION, 'dimensions': DIMENSIONS,
+                'digests': {date.date().isoformat(): int(digest) for date, digest in digests.items()}}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'rollup': json.dumps(metadata).encode()})
+    parquet.write_table(table, parquet_path)
+
+
+# Read (cube, digests) written next to a DCCS workbook, or None if missing or written by another version.
+def read_rollup(excel_file_path):
+    parquet_path = rollup_path(excel_file_path)
+    if pyarrow is None or not parquet_path.exists():
+        return None
+    try:
+        table = parquet.read_table(parquet_path)
+        metadata = json.loads(table.schema.metadata[b'rollup'])
+        if metadata['version'] != ROLLUP_VERSION or metadata['dimensions'] != DIMENSIONS:
+            return None
+        digests = pd.Series(metadata['digests'], dtype='uint64')
+        digests.index = pd.DatetimeIndex(pd.to_datetime(digests.index), name='Date')
+        return table.to_pandas(), digests
+    except Exception as e:
+        print(f"[INFO] No previous rollup, summing all dates: {e}")
+        return None
+
+
+# Configure Rollup tab formatting.
+def rollup_layout(df_cube):
+    df_sheet = df_cube.assign(Date=df_cube['Date'].dt.date)
+    layout = SheetLayout('Rollup', df_sheet, freeze_panes='A2',
+                         auto_filter=f'A1:{get_column_letter(df_sheet.shape[1])}1')
+    layout.column_widths[DIMENSIONS.index('Phase') + 1] = 40
+    layout.column_widths[DIMENSIONS.index('Date') + 1] = 13
+    layout.column_styles[df_sheet.columns.get_loc(MEASURE) + 1] = 'Cost'
+    return layout
+
+
+# Write the cube next to Today's DCCS, as a sheet and as Parquet (with its digests).
+def write_rollup(excel_file_path, df_cube, digests):
+    write_workbook(rollup_path(excel_file_path, '.xlsx'), [rollup_layout(df_cube)])
+    if pyarrow is None:
+        print("[WARNING] pyarrow is not installed, no rollup Parquet written.")
+        return
+    write_rollup_parquet(rollup_path(excel_file_path), df_cube, digests)
@@ -0,0 +1,135 @@
+# Methods to compare what-if scenarios of the lookahead.
+
+# Proposed workflow:
+# - Describe each scenario as a Scenario: time priority (e.g. DSV Time before AFE Time), phase time overrides and
+#   well delays.
+# - Ingest OCS, AFE and manual inputs once (pipeline stages), shared by all scenarios.
+# - Project, charge and cost each scenario in worker processes, from the same DCCS rows.
+# - Compare daily cost per well of each scenario with the lookahead as is (Base), in one table.
+
+# Settings (optional):
+# - SCENARIOS: list of Scenario to compare with Base, no comparison if not set.
+# - SCENARIO_JOBS: number of worker processes, 1 (in-process) by default.
+
+# This module has no import-time side effects so that worker processes can import it.
+
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from openpyxl.utils.cell import get_column_letter
+import DCCS
+import lookahead
+from excel_writer import SheetLayout
+from manual_inputs import apply_manual_inputs
+
+SCENARIO_TIME = 'Scenario Time'  # Lookahead column of overridden times, used right after Actual Time.
+
+
+@dataclass
+class Scenario:
+    name: str
+    time_priority: tuple = lookahead.TIME_PRIORITY
+    phase_times: dict = field(default_factory=dict)  # {(Well Name, Phase Code): projected hours of the phase}
+    delays: dict = field(default_factory=dict)  # {Well Name: hours of wait before its first projected operation}
+
+    # Time priority with overridden times right after Actual Time (first if Actual Time is not used).
+    def priority(self):
+        time_priority = [col for col in self.time_priority if col != SCENARIO_TIME]
+        position = time_priority.index('Actual Time') + 1 if 'Actual Time' in time_priority else 0
+        return tuple(time_priority[:position] + [SCENARIO_TIME] + time_priority[position:])
+
+    # Lookahead of the scenario. Operations with Actual Time are never changed.
+    def apply(self, df_lookahead):
+        df = df_lookahead.copy()
+        df[SCENARIO_TIME] = np.nan
+        for (well, phase_code), hours in self.phase_times.items():
+            rows = df['Actual Time'].isna() & (df['Well Name'] == well) & (df['Phase Code'] == phase_code).fillna(False)
+            if not rows.any():
+                print(f"[WARNING] Scenario {self.name}: no projected operation of {well} phase {phase_code}.")
+                continue
+            # Spread the phase time over its projected operations, in proportion to their projection time.
+            times = lookahead.calc_projection_time(df[rows], self.time_priority)
+            shares = times / times.sum() if times.sum() > 0 else pd.Series(1 / rows.sum(), index=times.index)
+            df.loc[rows, SCENARIO_TIME] = hours * shares
+        for well, hours in self.delays.items():
+            rows = np.flatnonzero(df['Actual Time'].isna() & (df['Well Name'] == well))
+            if not len(rows):
+                print(f"[WARNING] Scenario {self.name}: no projected operation of {well}.")
+                continue
+            # A wait row outside of any well phase, so that the well and all wells after it start later.
+            wait = pd.DataFrame({'Start Time': [df['Start Time'].iloc[0] if rows[0] == 0 else None],
+                                 'Well Name': [None], 'Phase Code': [0], 'Phase': ['Wait'],
+                                 'Description': [f'{self.name}: {well} delayed'], SCENARIO_TIME: [hours]})
+            df = pd.concat([df.iloc[:rows[0]], wait, df.iloc[rows[0]:]], ignore_index=True)
+        return df
+
+
+BASE = Scenario('Base')
+
+
+# Daily cost in USD of charges by Well Name and Date.
+def daily_well_costs(df_DCCS, df_charges, fx_table, today):
+    df_lines = df_charges.join(df_DCCS[['Well Name', 'Currency', 'SAP Unit Price']], on='Row')
+    amounts = df_lines['Quantity'] * pd.to_numeric(df_lines['SAP Unit Price']).fillna(0)
+    df_lines['Cost (USD)'] = np.nan_to_num(fx_table.to_usd(amounts, df_lines['Currency'], df_lines['Date'],
+                                                           today=today))
+    return df_lines.groupby(['Well Name', 'Date'], as_index=False, observed=True)['Cost (USD)'].sum()
+
+
+# Project, charge and cost one scenario. df_lookahead is the lookahead as read, df_DCCS the DCCS rows and df_manual the
+# stored manual inputs of (uid, Date, Quantity) before the cut-off date.
+def charge_scenario(scenario, df_lookahead, df_AFE, df_DCCS, df_manual, fx_table, today):
+    df_lookahead = scenario.apply(df_lookahead)
+    with contextlib.redirect_stdout(io.StringIO()):  # Messages are the same as in the pipeline run.
+        df_projection = lookahead.project_lookahead(df_lookahead, scenario.priority())
+        well_date_range = lookahead.calc_well_date_range(df_projection)
+        grouped_df = lookahead.group_by_phase(df_projection, df_AFE)
+        df_day_fraction = lookahead.build_day_fractions(grouped_df, well_date_range)
+        df_charges, _ = DCCS.charge_DCCS(df_DCCS, grouped_df, df_day_fraction, well_date_range)
+        df_charges, _ = apply_manual_inputs(df_DCCS, df_charges, df_manual, well_date_range)
+    return daily_well_costs(df_DCCS, df_charges, fx_table, today)
+
+
+# Charge Base and each scenario using up to jobs worker processes (in-process if jobs is 1).
+# Returns a table of daily cost per well of each scenario, and its delta to Base.
+def run_scenarios(scenarios, df_lookahead, df_AFE, df_DCCS, df_manual, fx_table, today, jobs=1):
+    scenarios = [BASE] + [scenario for scenario in scenarios if scenario.name != BASE.name]
+    inputs = (df_lookahead, df_AFE, df_DCCS, df_manual, fx_table, today)
+    jobs = max(1, min(jobs or 1, len(scenarios)))
+    if jobs == 1:
+        results = [charge_scenario(scenario, *inputs) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(charge_scenario, scenarios, *[[x] * len(scenarios) for x in inputs]))
+    return compare_scenarios([scenario.name for scenario in scenarios], results)
+
+
+# Join daily costs of scenarios by Well Name and Date. Deltas are to the first scenario.
+def compare_scenarios(names, results):
+    df = None
+    for name, df_costs in zip(names, results):
+        df_costs = df_costs.rename(columns={'Cost (USD)': f'{name} (USD)'})
+        df = df_costs if df is None else df.merge(df_costs, on=['Well Name', 'Date'], how='outer')
+    df = df.sort_values(by=['Well Name', 'Date'], ignore_index=True).fillna(0)
+    for name in names[1:]:
+        df[f'{name} Delta (USD)'] = df[f'{name} (USD)'] - df[f'{names[0]} (USD)']
+    df['Date'] = df['Date'].dt.date
+    return df
+
+
+def scenarios_path(excel_file_path):
+    return excel_file_path.with_name(excel_file_path.stem + '.scenarios.xlsx')
+
+
+# Configure Scenarios tab formatting.
+def scenarios_layout(df_scenarios):
+    layout = SheetLayout('Scenarios', df_scenarios, freeze_panes='C2',
+                         auto_filter=f'A1:{get_column_letter(df_scenarios.shape[1])}1')
+    layout.column_widths[2] = 13
+    for i in range(3, df_scenarios.shape[1] + 1):
+        layout.column_styles[i] = 'Cost'
+        layout.column_widths[i] = 18
+    return layout
@@ -0,0 +1,59 @@
+# Methods to declare and apply the column types of OCS, lookahead and DCCS frames.
+
+# Proposed workflow:
+# - Declare one type per column name, shared by all frames (a column has the same type wherever it appears).
+# - Apply the schema when frames are read (OCS, lookahead, DCCS) and again after steps that lose types, e.g. a
+#   concat or merge of categoricals with different categories.
+# - Group by categorical columns with observed=True, so that only combinations present in the frame are grouped.
+# - Report memory of frames as typed against the same frames with inferred types (object for text).
+
+# Types:
+# - category: repeated text (Well Name, Event, Cost Group, Currency, Unit of Measure, File Name...).
+# - Int64: nullable integers (Phase Code, Item Number).
+# - float64: quantities, prices, times in hours. Kept at 64 bits so that totals match the workbook formulas.
+# - datetime64[ns]: times.
+
+import pandas as pd
+
+SCHEMA = {
+    'Well Name': 'category', 'Event': 'category', 'Cost Group': 'category', 'Currency': 'category',
+    'Unit of Measure': 'category', 'File Name': 'category', 'Vendor': 'category', 'Demand Category': 'category',
+    'Phase Code': 'Int64', 'Item Number': 'Int64',
+    'Quantity': 'float64', 'SAP Unit Price': 'float64', 'AFE Cost': 'float64',
+    'AFE Time': 'float64', 'DSV Time': 'float64', 'Actual Time': 'float64', 'Projection Time': 'float64',
+    'Start Time': 'datetime64[ns]', 'Projection Start Time': 'datetime64[ns]', 'Projection End Time': 'datetime64[ns]',
+}
+
+
+def convert(column, dtype):
+    if dtype in ('Int64', 'float64'):
+        column = pd.to_numeric(column)
+    elif dtype == 'datetime64[ns]':
+        column = pd.to_datetime(column)
+    return column.astype(dtype)
+
+
+# Cast the columns of df declared in schema. Columns that cannot be cast (e.g. text Item Number) are kept as they are.
+def apply_schema(df, schema=None):
+    schema = SCHEMA if schema is None else schema
+    df = df.copy()
+    for col in df.columns:
+        dtype = schema.get(col) if isinstance(col, str) else None
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        try:
+            df[col] = convert(df[col], dtype)
+        except (TypeError, ValueError) as e:
+            print(f"[WARNING] Column {col} kept as {df[col].dtype}, not {dtype}: {e}")
+    return df
+
+
+# Deep memory in MB of each frame ({name: dataframe}) as typed, and with inferred types as before the schema.
+def memory_report(frames):
+    rows = []
+    for name, df in frames.items():
+        typed = df.memory_usage(deep=True).sum() / 1024 ** 2
+        inferred = df.astype(object).infer_objects().memory_usage(deep=True).sum() / 1024 ** 2
+        rows.append({'Frame': name, 'Rows': len(df), 'Inferred MB': inferred, 'Typed MB': typed,
+                     'Reduction %': 100 * (1 - typed / inferred) if inferred else 0.0})
+    return pd.DataFrame(rows)
@@ -0,0 +1,61 @@
+# Methods to write and read the Arrow/Feather sidecar of a DCCS workbook.
+
+# Proposed workflow:
+# - After export, write the tables behind the workbook next to it as <stem>.<table>.feather.
+# - Another process memory-maps the sidecar instead of parsing the workbook.
+# - Remove a stale sidecar when exporting without one, so it never disagrees with the workbook.
+
+# Sidecar tables:
+# - DCCS: DCCS rows without date columns.
+# - charges: long table of (Row, Date, Quantity) by DCCS row.
+# - phases: grouped_df, the performance tracker grouped by well phase.
+# - day_fraction: long table of (Row, Date, Day Fraction) by phases row.
+
+# Settings (optional):
+# - SIDECAR: write the sidecar on export.
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather as feather
+except ImportError:  # Optional dependency, no sidecar is written.
+    pyarrow = None
+
+SIDECAR_TABLES = ['DCCS', 'charges', 'phases', 'day_fraction']
+
+
+def sidecar_path(excel_file_path, table_name):
+    return excel_file_path.with_name(f'{excel_file_path.stem}.{table_name}.feather')
+
+
+# Convert a dataframe to an Arrow table. Object columns of mixed types are stored as strings.
+def to_arrow_table(df):
+    arrays = []
+    for col in df.columns:
+        try:
+            arrays.append(pyarrow.array(df[col], from_pandas=True))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            arrays.append(pyarrow.array(df[col].map(lambda x: None if pd.isna(x) else str(x)), from_pandas=True))
+    return pyarrow.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+
+def write_sidecar(excel_file_path, tables):
+    if pyarrow is None:
+        print("[WARNING] pyarrow is not installed, no sidecar written.")
+        return
+    for table_name in SIDECAR_TABLES:
+        feather.write_feather(to_arrow_table(tables[table_name]), sidecar_path(excel_file_path, table_name))
+
+
+def remove_sidecar(excel_file_path):
+    for table_name in SIDECAR_TABLES:
+        sidecar_path(excel_file_path, table_name).unlink(missing_ok=True)
+
+
+# Read the sidecar of a workbook as {table name: dataframe}, or None if there is no complete sidecar.
+def read_sidecar(excel_file_path):
+    if pyarrow is None or not all(sidecar_path(excel_file_path, name).exists() for name in SIDECAR_TABLES):
+        return None
+    return {name: feather.read_table(sidecar_path(excel_file_path, name), memory_map=True).to_pandas()
+            for name in SIDECAR_TABLES}
@@ -0,0 +1,195 @@
+# Methods to generate a synthetic drilling campaign for benchmarks.
+
+# Proposed workflow:
+# - Describe the campaign size with a CampaignSpec: wells, phases, OCS files, lines per OCS, mechanism mix, length.
+# - Write a lookahead (LookaheadTable), OCS workbooks (OCSTable with B4:B6 metadata) and a prior DCCS.
+# - Return settings for the campaign, to run a Pipeline on it without settings.py.
+
+# Generated data is reproducible for the same spec and seed.
+
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+import openpyxl
+import pandas as pd
+from openpyxl.worksheet.table import Table
+from DCCS import DCCS_headers
+
+PHASES = [(1, 'Conductor', 'DRO'), (2, 'Surface', 'DRO'), (3, 'Intermediate', 'DRO'), (4, 'Production', 'DRO'),
+          (5, 'Completion', 'COM'), (6, 'Testing', 'COM'), (7, 'Suspension', 'ABA'), (8, 'Abandonment', 'ABA')]
+LOOKAHEAD_HEADERS = ['Start Time', 'Well Name', 'Phase Code', 'Phase', 'Description', 'AFE Time', 'DSV Time',
+                     'Actual Time']
+OCS_HEADERS = ['Item Number', 'Description', 'SAP Element Number', 'Quantity', 'Unit of Measure',
+               'Estimated Duration', 'Currency', 'SAP Unit Price', 'Total Price', 'Remarks', 'Cost Group', 'Event',
+               'Charging Mechanism']
+
+
+@dataclass
+class CampaignSpec:
+    wells: int = 3
+    phases: int = 6  # Phases per well, at most len(PHASES).
+    operations: int = 3  # Maximum lookahead rows per phase.
+    ocs_files: int = 6
+    lines: int = 12  # Lines per OCS.
+    days: int = 90  # Campaign length.
+    tariff_every: int = 4  # Every n-th OCS is a tariff (no Well Name or Event).
+    actual_fraction: float = 0.3  # Share of the campaign already drilled (with Actual Time) at Today.
+    prior_rows: float = 0.2  # Share of OCS lines with manual inputs in the prior DCCS.
+    mechanism_mix: dict = field(default_factory=lambda: {
+        'from phase': 0.25, 'from date': 0.1, 'for': 0.3, 'on phase': 0.15, 'on date': 0.05, 'invalid': 0.05,
+        'empty': 0.1})
+    seed: int = 1
+
+
+class CampaignGenerator:
+    def __init__(self, spec, root):
+        self.spec = spec
+        self.root = Path(root)
+        self.rng = random.Random(spec.seed)
+        self.wells = [f'Well-{i + 1:02d}' for i in range(spec.wells)]
+        self.phases = PHASES[:spec.phases]
+        self.start_time = pd.Timestamp('2024-01-01 06:00:00')
+        self.today = (self.start_time + pd.Timedelta(days=spec.days * spec.actual_fraction)).normalize()
+
+    # Generate lookahead rows and AFE. AFE Time is scaled so that the campaign lasts about spec.days.
+    def lookahead(self):
+        spec = self.spec
+        afe_times = {(well, code): [self.rng.choice([6.0, 12.0, 18.0, 24.0, 36.0, 48.0])
+                                    for _ in range(self.rng.randint(1, spec.operations))]
+                     for well in self.wells for code, _, _ in self.phases}
+        scale = (spec.days - 2) * 24 / sum(sum(times) for times in afe_times.values())
+        rows = [[self.start_time, None, 0, 'Rig Move', 'Move to location', 48.0, 60.0, 48.0]]
+        afe = []
+        hours = 48.0
+        for well in self.wells:
+            for code, phase, event in self.phases:
+                for k, afe_time in enumerate(afe_times[(well, code)]):
+                    afe_time = round(afe_time * scale, 1)
+                    actual_time = None
+                    if hours + afe_time < spec.days * spec.actual_fraction * 24:
+                        actual_time = round(afe_time * self.rng.uniform(0.8, 1.3), 1)
+                    rows.append([None, well, code, phase, f'{phase} operation {k + 1}', afe_time, afe_time * 1.2,
+                                 actual_time])
+                    hours += actual_time or afe_time
+                total = sum(round(time * scale, 1) for time in afe_times[(well, code)])
+                afe.append([well, code, event, total, total * 1500.0, code * 500.0])
+        df_AFE = pd.DataFrame(afe, columns=['Well Name', 'Phase Code', 'Event', 'AFE Time', 'AFE Cost',
+                                            'Planned Depth'])
+        return pd.DataFrame(rows, columns=LOOKAHEAD_HEADERS), df_AFE
+
+    def mechanism(self, well):
+        kinds = list(self.spec.mechanism_mix)
+        kind = self.rng.choices(kinds, weights=[self.spec.mechanism_mix[k] for k in kinds])[0]
+        codes = [code for code, _, _ in self.phases]
+        cap = f" for maximum {self.rng.randint(2, 20)} occurrences" if self.rng.random() < 0.4 else ''
+        start_date = self.start_time + pd.Timedelta(days=self.rng.randint(0, self.spec.days // 2))
+        end_date = start_date + pd.Timedelta(days=self.rng.randint(1, self.spec.days // 2))
+        if kind == 'from phase':
+            first, last = sorted(self.rng.sample(codes, 2)) if len(codes) > 1 else (codes[0], codes[0])
+            return f"{self.rng.choice([1, 2, 0.5])} unit/day from start phase {first} to end phase {last}{cap}"
+        if kind == 'from date':
+            return f"1 unit/day from {start_date:%Y/%m/%d} to {end_date:%Y/%m/%d}{cap}"
+        if kind == 'for':
+            well_phases = {well: sorted(self.rng.sample(codes, min(2, len(codes))))}
+            if self.rng.random() < 0.3:
+                well_phases[self.rng.choice(self.wells)] = codes[-2:]
+            return f"{self.rng.choice([1, 3])} unit/day for {well_phases}{cap}"
+        if kind == 'on phase':
+            return (f"{self.rng.choice([1, 2500])} unit/day on {self.rng.choice(['start', 'end'])} phase "
+                    f"{self.rng.choice(codes)}")
+        if kind == 'on date':
+            return f"1 unit/day on {start_date:%Y/%m/%d}"
+        if kind == 'invalid':
+            return "as per call-out"
+        return None
+
+    # Generate OCS files as (file name, metadata, lines).
+    def ocs(self):
+        files = []
+        for i in range(self.spec.ocs_files):
+            tariff = self.spec.tariff_every and i % self.spec.tariff_every == self.spec.tariff_every - 1
+            well = None if tariff else self.rng.choice(self.wells)
+            lines = []
+            for k in range(self.spec.lines):
+                event = None if tariff else self.rng.choice(sorted({event for _, _, event in self.phases}))
+                lines.append([k + 1, f'Item {i}-{k}', f'E{k % 7}', 1, self.rng.choice(['day', 'ea', 'lot']), 5,
+                              self.rng.choice(['USD', 'MYR']), round(self.rng.uniform(100, 9000), 2), None, None,
+                              self.rng.choice(['Rig', 'Services', 'Materials', 'Logistics']), event,
+                              self.mechanism(well or self.rng.choice(self.wells))])
+            files.append((f'OCS_{i:04d}.xlsx', (f'OCS-{i:04d}', well, f'WBS-{i:04d}'), lines))
+        return files
+
+    def write_lookahead(self, df_lookahead, excel_file_path):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = 'Drilling Input'
+        ws.append(LOOKAHEAD_HEADERS)
+        for row in df_lookahead.itertuples(index=False):
+            ws.append([None if pd.isna(value) else value for value in row])
+        ws.add_table(Table(displayName='LookaheadTable', ref=f'A1:H{len(df_lookahead) + 1}'))
+        wb.save(excel_file_path)
+
+    def write_ocs(self, metadata, lines, excel_file_path):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = 'OCS Input'
+        for row, (label, value) in enumerate(zip(['OCS Number', 'Well Name', 'WBS Number'], metadata), start=4):
+            ws.cell(row=row, column=1, value=label)
+            ws.cell(row=row, column=2, value=value)
+        for col, header in enumerate(OCS_HEADERS, start=1):
+            ws.cell(row=8, column=col, value=header)
+        for row, line in enumerate(lines, start=9):
+            for col, value in enumerate(line, start=1):
+                ws.cell(row=row, column=col, value=value)
+        ws.add_table(Table(displayName='OCSTable', ref=f'A8:M{8 + max(len(lines), 1)}'))
+        wb.save(excel_file_path)
+
+    # Write a prior DCCS with manual inputs for a share of the (non-tariff) OCS lines, on days before Today.
+    def write_prior_DCCS(self, files, excel_file_path):
+        dates = pd.date_range(self.start_time.normalize(), self.today - pd.Timedelta(days=1))
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet('DCCS')
+        for _ in range(10):
+            ws.append([])
+        ws.append(DCCS_headers + [date.to_pydatetime() for date in dates])
+        for file_name, (ocs_number, well, wbs_number), lines in files:
+            if well is None:
+                continue
+            for line in lines:
+                if self.rng.random() >= self.spec.prior_rows:
+                    continue
+                values = {'File Name': file_name, 'Vendor': 'Placeholder', 'Well Name': well, 'Event': line[11],
+                          'OCS Number': ocs_number, 'Item Number': line[0], 'WBS Number': wbs_number,
+                          'Demand Category': 'Placeholder', 'Cost Group': line[10], 'Description': line[1],
+                          'SAP Unit Price': line[7], 'Currency': line[6], 'Unit of Measure': line[4],
+                          'Charging Mechanism': line[12]}
+                quantities = [self.rng.choice([None, None, 0, 1, 2]) for _ in dates]
+                ws.append([values.get(header) for header in DCCS_headers] + quantities)
+        wb.save(excel_file_path)
+
+    # Write all workbooks under root and return settings for the campaign.
+    def write(self):
+        (self.root / 'OCS').mkdir(parents=True, exist_ok=True)
+        for excel_file_path in (self.root / 'OCS').glob('*.xlsx'):
+            excel_file_path.unlink()
+        df_lookahead, df_AFE = self.lookahead()
+        self.write_lookahead(df_lookahead, self.root / 'lookahead.xlsx')
+        files = self.ocs()
+        for file_name, metadata, lines in files:
+            self.write_ocs(metadata, lines, self.root / 'OCS' / file_name)
+        self.write_prior_DCCS(files, self.root / 'DCCS_prior.xlsx')
+        df_AFE.to_csv(self.root / 'AFE.csv', index=False)
+        return self.settings(df_AFE)
+
+    def settings(self, df_AFE):
+        return SimpleNamespace(TODAY=self.today, USDMYR=4.7, df_AFE=df_AFE, OCS_DIR=self.root / 'OCS',
+                               LATEST_LOOKAHEAD_DIR=self.root / 'lookahead.xlsx',
+                               LATEST_DCCS_DIR=self.root / 'DCCS_prior.xlsx',
+                               TODAY_DCCS_DIR=self.root / 'DCCS_today.xlsx',
+                               MANUAL_INPUT_STORE=self.root / 'manual_inputs.sqlite', CACHE_DIR=None)
+
+
+# Generate a campaign under root and return its settings.
+def generate_campaign(root, spec=None):
+    return CampaignGenerator(spec or CampaignSpec(), root).write()
@@ -0,0 +1,48 @@
+# Tests of the command-line runner exit status on synthetic campaigns.
+
+# Usage:
+# - python -m pytest -q test_main.py
+
+import pickle
+import sys
+import pytest
+from charging import charge_state_path, read_charge_state
+from main import main
+from synthetic import CampaignSpec, generate_campaign
+
+
+# Generate a campaign with mechanism_mix and register its settings as an importable module for --settings.
+def campaign_settings(tmp_path, monkeypatch, mechanism_mix):
+    settings = generate_campaign(tmp_path, CampaignSpec(mechanism_mix=mechanism_mix))
+    monkeypatch.setitem(sys.modules, 'campaign_settings', settings)
+    return 'campaign_settings'
+
+
+# Rows without a Charging Mechanism are manual input rows, not charging failures.
+def test_manual_only_rows_exit_0(tmp_path, monkeypatch):
+    settings = campaign_settings(tmp_path, monkeypatch, {'from phase': 0.4, 'for': 0.3, 'empty': 0.3})
+    assert main(['--settings', settings, '--stages', 'dccs']) == 0
+
+
+def test_invalid_mechanisms_exit_1(tmp_path, monkeypatch):
+    settings = campaign_settings(tmp_path, monkeypatch, {'from phase': 0.5, 'invalid': 0.2, 'empty': 0.3})
+    assert main(['--settings', settings, '--stages', 'dccs']) == 1
+
+
+def test_invalid_arguments_exit_2():
+    with pytest.raises(SystemExit) as e:
+        main(['--format', 'formulas', 'values'])
+    assert e.value.code == 2
+
+
+# The charge state is only saved for incremental charging, as plain arrays; a pickled state is never loaded.
+def test_incremental_charge_state(tmp_path, monkeypatch):
+    settings = campaign_settings(tmp_path, monkeypatch, {'from phase': 0.5, 'for': 0.3, 'empty': 0.2})
+    assert main(['--settings', settings, '--stages', 'dccs']) == 0
+    assert not charge_state_path(sys.modules[settings].TODAY_DCCS_DIR).exists()
+    sys.modules[settings].INCREMENTAL_CHARGING = True
+    assert main(['--settings', settings, '--stages', 'dccs']) == 0
+    assert read_charge_state(sys.modules[settings].TODAY_DCCS_DIR)['charges']
+    with open(charge_state_path(sys.modules[settings].TODAY_DCCS_DIR), 'wb') as f:
+        pickle.dump({'charges': {}}, f)
+    assert read_charge_state(sys.modules[settings].TODAY_DCCS_DIR) is None
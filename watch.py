@@ -0,0 +1,100 @@
+# Methods to regenerate Today's DCCS whenever its inputs change, keeping parsed inputs and stage results in memory.
+
+# Proposed workflow:
+# - Run the pipeline once, keeping parsed workbooks in memory (parse cache) and stage results (Pipeline).
+# - Poll the watched inputs for changed modification time or size. Excel lock files (~$*) are ignored.
+# - Wait until changed inputs are unchanged for one more poll, so that files still being saved are not read.
+# - Invalidate the stages reading changed inputs and run the pipeline again. Stages not depending on them (e.g.
+#   the OCS rows when only the lookahead changed) are reused, and only rows whose inputs changed are recharged.
+# - Keep watching after a failed run, the failed stages run again on the next change.
+
+# Watched inputs (stage reading them):
+# - LATEST_LOOKAHEAD_DIR (read_lookahead)
+# - OCS_DIR (ingest_OCS), each OCS is parsed again only if it changed
+# - LATEST_DCCS_DIR (manual_inputs)
+# - FX_RATES if a file (fx_table)
+
+# Settings (optional):
+# - WATCH_INTERVAL: seconds between polls, 2 by default.
+
+import time
+from pathlib import Path
+from cache import get_parse_cache
+from pipeline import Pipeline
+
+WATCHED_INPUTS = {'LATEST_LOOKAHEAD_DIR': 'read_lookahead', 'OCS_DIR': 'ingest_OCS',
+                  'LATEST_DCCS_DIR': 'manual_inputs', 'FX_RATES': 'fx_table'}
+
+
+# Paths of watched inputs set in settings, as {setting name: path}.
+def watched_paths(settings):
+    paths = {}
+    for name in WATCHED_INPUTS:
+        value = getattr(settings, name, None)
+        if isinstance(value, (str, Path)):
+            paths[name] = Path(value)
+    return paths
+
+
+# (modification time, size) of path, or of each file in path if a directory. Missing files are left out.
+def snapshot(path):
+    files = sorted(path.iterdir()) if path.is_dir() else [path]
+    state = {}
+    for f in files:
+        if f.name.startswith('~$'):
+            continue
+        try:
+            stat = f.stat()
+        except OSError:
+            continue
+        state[f.name] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def snapshots(paths):
+    return {name: snapshot(path) for name, path in paths.items()}
+
+
+# Run all stages of pipeline, reporting failures instead of raising them.
+def regenerate(pipeline):
+    start = time.perf_counter()
+    try:
+        pipeline.run()
+    except Exception as e:
+        print("Error:", e)
+        return False
+    print(f"[INFO] Watch: {pipeline.settings.TODAY_DCCS_DIR.name} generated in {time.perf_counter() - start:.1f} s")
+    return True
+
+
+# Generate Today's DCCS, then regenerate it on every change of the watched inputs until interrupted (or after
+# max_runs runs in total).
+def watch(settings=None, interval=None, max_runs=None):
+    pipeline = Pipeline(settings)
+    interval = interval or getattr(pipeline.settings, 'WATCH_INTERVAL', 2)
+    get_parse_cache(pipeline.settings).keep_in_memory()
+    paths = watched_paths(pipeline.settings)
+    state = snapshots(paths)
+    regenerate(pipeline)
+    runs = 1
+    print(f"[INFO] Watch: watching {', '.join(str(path) for path in paths.values())} every {interval} s")
+    previous = state
+    try:
+        while max_runs is None or runs < max_runs:
+            time.sleep(interval)
+            current = snapshots(paths)
+            if current != state and current == previous:
+                changed = [name for name in paths if current[name] != state[name]]
+                print(f"[INFO] Watch: {', '.join(changed)} changed.")
+                pipeline.invalidate(*[WATCHED_INPUTS[name] for name in changed])
+                regenerate(pipeline)
+                state = current
+                runs += 1
+            previous = current
+    except KeyboardInterrupt:
+        print("[INFO] Watch: stopped.")
+    return pipeline
+
+
+if __name__ == '__main__':
+    watch()